@@ -1,5 +1,5 @@
 from fastapi import FastAPI
-from routes import oauth_router, job_router, inngest_client, start_job, score_resume, query_router
+from routes import oauth_router, job_router, inngest_client, start_job, score_resume, score_resume_chunk, query_router
 import uvicorn
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
@@ -25,7 +25,7 @@ app.add_middleware(
 )
 
 # Serve the inngest functions
-inngest.fast_api.serve(app, inngest_client, [start_job, score_resume])
+inngest.fast_api.serve(app, inngest_client, [start_job, score_resume, score_resume_chunk])
 
 
 # Include routers
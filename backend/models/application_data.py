@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import Literal
 
 class User(BaseModel):
     user_id: str = Field(..., description="The ID of the user")
@@ -42,4 +43,7 @@ class ResumeData(BaseModel):
 class StartJobRequest(BaseModel):
     folder_id: str = Field(..., description="The Google Drive folder ID")
     folder_name: str = Field(..., description="The name of the folder")
-    name: str = Field(..., description="The name of the job")
\ No newline at end of file
+    name: str = Field(..., description="The name of the job")
+    recursive: bool = Field(False, description="Whether to include PDFs in subfolders")
+    incremental: bool = Field(False, description="Reuse the latest job for the folder and only score new or changed files")
+    mode: Literal["serial", "fan_out", "bulk"] = Field("fan_out", description="Score resumes one at a time, fan out to parallel runs, or as one offline OpenAI batch")
\ No newline at end of file
@@ -1,7 +1,7 @@
 # Routes package
 from .oauth import router as oauth_router
 from .queue import router as job_router
-from .queue import inngest_client, start_job, score_resume
+from .queue import inngest_client, start_job, score_resume, score_resume_chunk
 from .query import router as query_router
 
-__all__ = ["oauth_router", "job_router", "inngest_client", "start_job", "score_resume", "query_router"]
+__all__ = ["oauth_router", "job_router", "inngest_client", "start_job", "score_resume", "score_resume_chunk", "query_router"]
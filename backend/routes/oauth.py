@@ -1,26 +1,30 @@
 from fastapi import APIRouter
 from services.oauth_credentials_service import OAuthCredentialsService
 from fastapi.responses import RedirectResponse
-from fastapi import Response, Cookie, HTTPException, Request
+from fastapi import Response, Cookie, HTTPException, Request, Depends, Header
 from dotenv import load_dotenv
-from googleapiclient.discovery import build
+from services.google_api_service import get_service
+from services.executor_service import run_blocking
+import hmac
 import os
 from google.oauth2.credentials import Credentials
 from services.jwt_service import JwtService
-from supabase import create_client, Client
+from services.auth_service import auth_service, get_current_user, get_user_id
 
 load_dotenv()
 
 router = APIRouter()
 
 BASE_URL = os.getenv("FRONTEND_URL")
+# Shared secret the Modal workers send to fetch access tokens
+INTERNAL_API_SECRET = os.getenv("INTERNAL_API_SECRET")
 OAuthCredentialsService = OAuthCredentialsService()
 
 @router.get("/authorize")
 async def get_oauth_redirect_uri(response: Response, request: Request):
     # Check if user is already authenticated
     print("access_token", request.cookies.get("access_token"))
-    payload = JwtService.verify_token(request.cookies.get("access_token"))
+    payload = auth_service.verify_token(request.cookies.get("access_token"))
     if payload:
         return RedirectResponse(f"{BASE_URL}/", status_code=302)
 
@@ -78,12 +82,11 @@ async def oauth_callback(
         raise HTTPException(status_code=400, detail="State mismatch")
 
     flow = OAuthCredentialsService.get_flow()
-    flow.fetch_token(code=code)
+    await run_blocking(flow.fetch_token, code=code)
 
 
     # Get user information using Google API client
-    service = build('oauth2', 'v2', credentials=flow.credentials)
-    userinfo = service.userinfo().get().execute()
+    userinfo = await run_blocking(lambda: get_service('oauth2', 'v2', flow.credentials).userinfo().get().execute())
 
     # Store credentials in database
     try:
@@ -116,25 +119,16 @@ async def oauth_callback(
 
 
 @router.get("/me")
-async def get_me(request: Request):
-    payload = JwtService.verify_token(request.cookies.get("access_token"))
-    if not payload:
-        raise HTTPException(status_code=401, detail="Unauthorized invalid token")
-
-    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
-    user = supabase.table("User").select("*").eq("id", payload.get("user_id")).execute().data
-    if not user:
-        raise HTTPException(status_code=401, detail="Unauthorized could not find user")
-    user = user[0]
-    
+async def get_me(user: dict = Depends(get_current_user)):
     return user
 
 
 @router.post("/logout")
-async def logout(response: Response):
+async def logout(response: Response, access_token: str = Cookie(None)):
     """
     Logout endpoint that clears the JWT token cookie.
     """
+    auth_service.invalidate(access_token)
     response.delete_cookie(
         key="access_token",
         path="/",
@@ -146,17 +140,25 @@ async def logout(response: Response):
     return {"message": "Logged out successfully"}
 
 
-@router.get("/drive-files")
-async def get_drive_files(request: Request, next_page_token: str = None, page_size: int = 10):
-    payload = JwtService.verify_token(request.cookies.get("access_token"))
-    if not payload:
-        raise HTTPException(status_code=401, detail="Unauthorized invalid token")
+@router.get("/access-token")
+async def get_access_token(user_id: int, x_internal_secret: str = Header(None)):
+    """
+    Internal endpoint handing out a user's live Drive access token to the workers,
+    so a large fan-out refreshes the token once instead of once per worker.
+    """
+    if not INTERNAL_API_SECRET or not x_internal_secret or not hmac.compare_digest(x_internal_secret, INTERNAL_API_SECRET):
+        raise HTTPException(status_code=403, detail="Forbidden")
 
-    user_id = payload.get("user_id")
+    try:
+        return await OAuthCredentialsService.get_access_token(user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/drive-files")
+async def get_drive_files(next_page_token: str = None, page_size: int = 10, user_id: int = Depends(get_user_id)):
     credentials = await OAuthCredentialsService.get_credentials(user_id)
 
-    service = build('drive', 'v3', credentials=credentials)
-    
     # Build query parameters
     query_params = {
         "q": "mimeType = 'application/vnd.google-apps.folder'",
@@ -167,5 +169,6 @@ async def get_drive_files(request: Request, next_page_token: str = None, page_si
     if next_page_token and next_page_token != "null":
         query_params["pageToken"] = next_page_token
     
-    files = service.files().list(**query_params).execute()
+    # Clients are cached per thread, so the client is fetched on the worker thread that uses it
+    files = await run_blocking(lambda: get_service('drive', 'v3', credentials).files().list(**query_params).execute())
     return files
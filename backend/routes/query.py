@@ -1,48 +1,143 @@
-from fastapi import APIRouter,Response, Cookie, HTTPException, Request
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter,Response, Cookie, HTTPException, Request, Query, Depends
+from typing import Optional
+from fastapi.responses import RedirectResponse, StreamingResponse
 
 from services.oauth_credentials_service import OAuthCredentialsService
-from services.supabase_service import SupabaseService
-from services.jwt_service import JwtService
+from services.supabase_service import InvalidCursorError, SupabaseService
+from services.auth_service import get_user_id
+from services.job_events_service import JobEventsService
 
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
 
 load_dotenv()
 
 router = APIRouter()
 supabase_service = SupabaseService()
+job_events_service = JobEventsService()
+
+# Seconds between keep-alive comments on an idle job event stream
+JOB_EVENTS_KEEPALIVE = 15
 
 
 @router.get("/get-jobs")
-async def get_jobs(request: Request):
+async def get_jobs(user_id: int = Depends(get_user_id)):
     """
     Get all jobs for a user
     """
-    payload = JwtService.verify_token(request.cookies.get("access_token"))
-    if not payload:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    user_id = payload["user_id"]
-    return supabase_service.get_jobs_under_user(user_id)
+    return await supabase_service.get_jobs_under_user(user_id)
 
 @router.get("/get-resumes")
-async def get_job(job_id: int, request: Request):
+async def get_job(
+    job_id: int,
+    user_id: int = Depends(get_user_id),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+    columns: Optional[str] = None,
+):
     """
-    Get all resumes for a job
+    Get a job, its statistics and the first page of its resumes
     """
-    payload = JwtService.verify_token(request.cookies.get("access_token"))
-    if not payload:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    user_id = payload["user_id"]
-    return supabase_service.get_resumes_under_job(job_id)
+    try:
+        return await supabase_service.get_resumes_under_job(
+            job_id,
+            limit=limit,
+            cursor=cursor,
+            search=search,
+            columns=columns.split(",") if columns else None,
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
 
 @router.get("/get-resume")
-async def get_resume(resume_id: int, request: Request):
+async def get_resume(resume_id: int, user_id: int = Depends(get_user_id)):
     """
     Get a resume by id
     """
-    payload = JwtService.verify_token(request.cookies.get("access_token"))
-    if not payload:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    user_id = payload["user_id"]
-    return supabase_service.get_resume(resume_id)[0]
\ No newline at end of file
+    return (await supabase_service.get_resume(resume_id))[0]
+
+@router.get("/get-job-stats")
+async def get_job_stats(job_id: int, user_id: int = Depends(get_user_id)):
+    """
+    Get the score statistics for a job
+    """
+    return await supabase_service.get_job_stats(job_id)
+
+@router.get("/get-job-timings")
+async def get_job_timings(job_id: int, user_id: int = Depends(get_user_id)):
+    """
+    Get the per-stage latency percentiles for a job
+    """
+    return await supabase_service.get_job_timings(job_id)
+
+@router.get("/get-resumes-page")
+async def get_resumes_page(
+    job_id: int,
+    user_id: int = Depends(get_user_id),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    descending: bool = True,
+    status: Optional[str] = None,
+    school_year: Optional[str] = None,
+    min_gpa: Optional[float] = None,
+    max_gpa: Optional[float] = None,
+    min_internships: Optional[int] = None,
+    search: Optional[str] = None,
+    columns: Optional[str] = None,
+):
+    """
+    Get one page of resumes for a job, sorted by score and filtered server side
+    """
+    try:
+        return await supabase_service.get_resumes_page(
+            job_id,
+            limit=limit,
+            cursor=cursor,
+            descending=descending,
+            status=status,
+            school_year=school_year,
+            min_gpa=min_gpa,
+            max_gpa=max_gpa,
+            min_internships=min_internships,
+            search=search,
+            columns=columns.split(",") if columns else None,
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
+
+@router.get("/job-events")
+async def get_job_events(job_id: int, request: Request, user_id: int = Depends(get_user_id)):
+    """
+    Stream resume status and score changes of a job as server-sent events
+    """
+
+    async def stream():
+        async with job_events_service.subscribe(job_id) as events:
+            yield "retry: 3000\n\n"
+
+            # Taken once the subscription listens, changes made meanwhile follow it from the queue
+            snapshot = await job_events_service.snapshot(job_id)
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            if snapshot["status"] in ("completed", "failed"):
+                return
+
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=JOB_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event["type"] == "job" and event["status"] in ("completed", "failed"):
+                    break
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
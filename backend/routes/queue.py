@@ -1,21 +1,22 @@
 from fastapi import APIRouter
 from services.oauth_credentials_service import OAuthCredentialsService
 from fastapi.responses import RedirectResponse
-from fastapi import Response, Cookie, HTTPException, Request
-from services.jwt_service import JwtService
+from fastapi import HTTPException, Depends
+from services.auth_service import get_user_id
 from models.application_data import StartJobRequest
 import os
+from datetime import timedelta
 from dotenv import load_dotenv
 import inngest
-from supabase import create_client, Client
 import logging
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from supabase import create_client, Client
-import requests
 from services.supabase_service import SupabaseService
+from services.drive_service import DriveService
+from services.http_service import HttpService
+from services.tracing_service import Tracer, trace_id_for
 
 supabase_service = SupabaseService()
+http_service = HttpService()
 load_dotenv()
 
 router = APIRouter()
@@ -25,41 +26,99 @@ inngest_client = inngest.Inngest(
     logger=logging.getLogger("uvicorn"),
 )
 
+# Upper bounds on concurrently running score-resume functions in fan-out mode
+SCORE_RESUME_JOB_CONCURRENCY = int(os.getenv("SCORE_RESUME_JOB_CONCURRENCY", "10"))
+SCORE_RESUME_USER_CONCURRENCY = int(os.getenv("SCORE_RESUME_USER_CONCURRENCY", "25"))
+
+# Fan-out jobs score this many resumes per Modal call, 1 queues a score-resume run per resume
+SCORE_CHUNK_SIZE = int(os.getenv("SCORE_CHUNK_SIZE", "25"))
+SCORE_CHUNK_JOB_CONCURRENCY = int(os.getenv("SCORE_CHUNK_JOB_CONCURRENCY", "4"))
+SCORE_CHUNK_USER_CONCURRENCY = int(os.getenv("SCORE_CHUNK_USER_CONCURRENCY", "10"))
+
+# "fused" downloads, extracts and scores in one Modal call, "split" uses the separate download and score endpoints
+SCORE_PIPELINE = os.getenv("SCORE_PIPELINE", "fused")
+
+# Bulk jobs check their OpenAI batch this often, for up to the batch's 24 hour completion window
+BULK_POLL_MINUTES = 10
+BULK_MAX_POLLS = 24 * 60 // BULK_POLL_MINUTES + 6
+# A cancelled batch takes up to about 10 minutes to stop, after that it is collected as it is
+BULK_CANCEL_POLL_MINUTES = 1
+BULK_MAX_CANCEL_POLLS = 30
+
+# Number of resume rows written per multi-row upsert when registering a folder
+RESUME_INSERT_CHUNK_SIZE = 500
+
+
+async def record_stage_timings(rows: list[dict]) -> None:
+    """
+    Write the stage timings of exported spans, called in the background by the tracer
+    """
+    supabase = await supabase_service.get_supabase()
+    await supabase.table("stage_timings").insert(rows).execute()
+
+
+tracer = Tracer("polaris-backend", record_stage_timings)
+
+
+async def run_traced_step(ctx: inngest.Context, step_id: str, handler, *args, trace_id: str, attributes: dict):
+    """
+    Run a step inside a span of the given trace, the tracer exports it in the background.
+    Memoized steps are not run again on replays, so every step is timed exactly once.
+    """
+    async def traced(*args):
+        with tracer.span(step_id, trace_id=trace_id, attributes=attributes):
+            return await handler(*args)
+
+    return await ctx.step.run(step_id, traced, *args)
+
 
 
 
 @router.post("/start-job")
-async def start_job(request: Request, body: StartJobRequest):
+async def start_job(body: StartJobRequest, user_id: int = Depends(get_user_id)):
     """
     Start a job
     """
-    payload = JwtService.verify_token(request.cookies.get("access_token"))
-    if not payload:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    
-    user_id = payload["user_id"]
-    credentials_dict = await OAuthCredentialsService.get_credentials_dict(user_id)
+    # Incremental runs only enqueue the delta, which the serial loop does not support
+    if body.incremental and body.mode == "serial":
+        raise HTTPException(status_code=400, detail="Incremental jobs must use the fan_out or bulk mode")
+
+    # Fails early if the user has no Drive access and warms the credentials cache for the job's steps
+    await OAuthCredentialsService.get_credentials(user_id)
 
     try:
 
+        supabase = await supabase_service.get_supabase()
+
+        # An incremental run reuses the latest job for the folder so only the delta is scored
+        job = None
+        if body.incremental:
+            previous_jobs = (await supabase.table("jobs").select("*").eq("user_id", user_id).eq("google_id", body.folder_id).order("created_at", desc=True).limit(1).execute()).data
+            if previous_jobs:
+                job = (await supabase.table("jobs").update({
+                    "status": "pending"
+                }).eq("id", previous_jobs[0]["id"]).execute()).data[0]
+
         # Upload the job to postgres
-        supabase = supabase_service.get_supabase()
-        job = supabase.table("jobs").insert({
-            "user_id": user_id,
-            "google_id": body.folder_id,
-            "status": "pending",
-            "folder_name": body.folder_name,
-            "name": body.name,
-        }).execute().data[0]
+        if job is None:
+            job = (await supabase.table("jobs").insert({
+                "user_id": user_id,
+                "google_id": body.folder_id,
+                "status": "pending",
+                "folder_name": body.folder_name,
+                "name": body.name,
+            }).execute()).data[0]
         
         await inngest_client.send(
             inngest.Event(
                 name="app/start-job",
                 data={
                     "user_id": user_id,
-                    "credentials_dict": credentials_dict,
                     "folder_id": body.folder_id,
-                    "job_id": job["id"]
+                    "job_id": job["id"],
+                    "mode": body.mode,
+                    "recursive": body.recursive,
+                    "incremental": body.incremental,
                 },
             )
         )
@@ -73,9 +132,15 @@ async def kill_job(ctx: inngest.Context) -> None:
     """
     Kill a job
     """
-    job_id = ctx.event.data["event"]["data"]["job_id"]
-    supabase = supabase_service.get_supabase()
-    supabase.table("jobs").update({
+    await fail_job(ctx.event.data["event"]["data"]["job_id"])
+
+
+async def fail_job(job_id: int) -> None:
+    """
+    Mark the job as failed
+    """
+    supabase = await supabase_service.get_supabase()
+    await supabase.table("jobs").update({
         "status": "failed"
     }).eq("id", job_id).execute()
 
@@ -83,12 +148,17 @@ async def kill_resume_job(ctx: inngest.Context) -> None:
     """
     Kill a resume job
     """
-    resume_job_id = ctx.event.data["event"]["data"]["resume_job_id"]
-    supabase = supabase_service.get_supabase()
-    supabase.table("resumes").update({
+    event_data = ctx.event.data["event"]["data"]
+    resume_job_id = event_data["resume_job_id"]
+    supabase = await supabase_service.get_supabase()
+    await supabase.table("resumes").update({
         "status": "failed"
     }).eq("id", resume_job_id).execute()
 
+    # In fan-out mode the last child to finish is responsible for closing the job
+    if event_data.get("track_completion"):
+        await complete_job_if_done(event_data["job_id"])
+
 @inngest_client.create_function(
     fn_id="start-job",
     trigger=inngest.TriggerEvent(event="app/start-job"),
@@ -100,20 +170,58 @@ async def start_job(ctx: inngest.Context) -> None:
     """
     Start a folder review job
     """
-    # Obtain user information and get credentials to allow gdrive access
+    # Events only carry ids, the steps resolve the user's Drive credentials themselves
     folder_id = ctx.event.data["folder_id"]
     user_id = ctx.event.data["user_id"]
-    credentials_dict = ctx.event.data["credentials_dict"]
     job_id = ctx.event.data["job_id"]
 
 
+    recursive = ctx.event.data.get("recursive", False)
+
+    mode = ctx.event.data.get("mode", "serial")
+    trace = {"trace_id": trace_id_for("job", job_id), "attributes": {"job.id": job_id}}
+
+    if ctx.event.data.get("incremental") or mode in ("fan_out", "bulk"):
+        if ctx.event.data.get("incremental"):
+            # Only enqueue files that are new or changed since the job last ran
+            resume_job_ids = await run_traced_step(
+                ctx,
+                "sync-files",
+                sync_files,
+                folder_id,
+                user_id,
+                job_id,
+                recursive,
+                **trace,
+            )
+        else:
+            # Register resumes while the folder is still being listed
+            resume_job_ids = await run_traced_step(
+                ctx,
+                "intake-files",
+                intake_files,
+                folder_id,
+                user_id,
+                job_id,
+                recursive,
+                **trace,
+            )
+
+        if mode == "bulk":
+            await bulk_score_resumes(ctx, job_id, user_id)
+        else:
+            await fan_out_score_resumes(ctx, resume_job_ids, job_id, user_id)
+        return
+
     # Get all pdf files within the chosen folder
-    files = await ctx.step.run(
+    files = await run_traced_step(
+        ctx,
         "get-files",
         get_files,
         folder_id,
         user_id,
-        credentials_dict,
+        recursive,
+        **trace,
     )
 
     # Invoke score-resume function for each file
@@ -126,6 +234,8 @@ async def start_job(ctx: inngest.Context) -> None:
                 file["id"],
                 job_id,
                 file["name"],
+                file.get("md5Checksum"),
+                file.get("modifiedTime"),
             )
             # Queue the score-resume function
             await ctx.step.invoke(
@@ -135,7 +245,7 @@ async def start_job(ctx: inngest.Context) -> None:
                     "file_id": file["id"],
                     "resume_job_id": resume_job["id"],
                     "job_id": job_id,
-                    "credentials_dict": credentials_dict
+                    "user_id": user_id,
                 }
             )
         except Exception as e:
@@ -148,50 +258,223 @@ async def start_job(ctx: inngest.Context) -> None:
         job_id
     )
 
+
+async def fan_out_score_resumes(ctx: inngest.Context, resume_job_ids: dict[str, int], job_id: int, user_id: int) -> None:
+    """
+    Queue the scoring of every registered resume in one batch of events, a score-resume-chunk
+    run per SCORE_CHUNK_SIZE resumes or a score-resume run per resume.
+    The job is closed by whichever child finishes last, see complete_job_if_done.
+    """
+    if not resume_job_ids:
+        await ctx.step.run("update-job-status", update_job_status, job_id)
+        return
+
+    if SCORE_CHUNK_SIZE > 1:
+        ids = list(resume_job_ids.values())
+        await ctx.step.send_event(
+            "queue-score-resume-chunks",
+            [
+                inngest.Event(
+                    name="app/score-resume-chunk",
+                    data={
+                        "resume_job_ids": ids[start:start + SCORE_CHUNK_SIZE],
+                        "job_id": job_id,
+                        "user_id": user_id,
+                    },
+                )
+                for start in range(0, len(ids), SCORE_CHUNK_SIZE)
+            ],
+        )
+        return
+
+    await ctx.step.send_event(
+        "queue-score-resumes",
+        [
+            inngest.Event(
+                name="app/score-resume",
+                data={
+                    "file_id": file_id,
+                    "resume_job_id": resume_job_id,
+                    "job_id": job_id,
+                    "user_id": user_id,
+                    "track_completion": True,
+                },
+            )
+            for file_id, resume_job_id in resume_job_ids.items()
+        ],
+    )
+
+
+async def bulk_score_resumes(ctx: inngest.Context, job_id: int, user_id: int) -> None:
+    """
+    Score every pending resume of the job through one OpenAI batch and wait for it to finish
+    """
+    trace = {"trace_id": trace_id_for("job", job_id), "attributes": {"job.id": job_id}}
+    batch = await run_traced_step(
+        ctx,
+        "submit-score-batch",
+        submit_score_batch,
+        job_id,
+        user_id,
+        **trace,
+    )
+
+    completed = True
+    if batch["batch_id"]:
+        result = {"done": False}
+        for poll in range(BULK_MAX_POLLS):
+            await ctx.step.sleep(f"wait-score-batch-{poll}", timedelta(minutes=BULK_POLL_MINUTES))
+            result = await run_traced_step(
+                ctx,
+                f"collect-score-batch-{poll}",
+                collect_score_batch,
+                batch["batch_id"],
+                job_id,
+                batch["requests"],
+                **trace,
+            )
+            if result["done"]:
+                break
+
+        if not result["done"]:
+            # Out of polls, cancel the batch and collect what it wrote once the cancellation is through
+            await run_traced_step(
+                ctx,
+                "cancel-score-batch",
+                collect_score_batch,
+                batch["batch_id"],
+                job_id,
+                batch["requests"],
+                True,
+                **trace,
+            )
+            for poll in range(BULK_MAX_CANCEL_POLLS):
+                await ctx.step.sleep(f"wait-cancel-score-batch-{poll}", timedelta(minutes=BULK_CANCEL_POLL_MINUTES))
+                # The last check collects the batch as it is, failing the resumes it has not scored
+                result = await run_traced_step(
+                    ctx,
+                    f"collect-cancelled-score-batch-{poll}",
+                    collect_score_batch,
+                    batch["batch_id"],
+                    job_id,
+                    batch["requests"],
+                    False,
+                    poll == BULK_MAX_CANCEL_POLLS - 1,
+                    **trace,
+                )
+                if result["done"]:
+                    break
+        completed = result["status"] == "completed"
+
+    if completed:
+        await ctx.step.run(
+            "update-job-status",
+            update_job_status,
+            job_id
+        )
+    else:
+        await ctx.step.run(
+            "fail-job",
+            fail_job,
+            job_id
+        )
+
+
 async def update_job_status(job_id: int) -> None:
     """
     Update the job status
     """
-    supabase = supabase_service.get_supabase()
-    supabase.table("jobs").update({
+    supabase = await supabase_service.get_supabase()
+    await supabase.table("jobs").update({
         "status": "completed"
     }).eq("id", job_id).execute()
 
 
-async def get_files(folder_id: str, user_id: str, credentials_dict: dict) -> list[dict]:
+async def complete_job_if_done(job_id: int) -> bool:
+    """
+    Mark the job as completed once none of its resumes are still pending
+    """
+    supabase = await supabase_service.get_supabase()
+    pending = await supabase.table("resumes").select("id", count="exact").eq("job_id", job_id).eq("status", "pending").limit(1).execute()
+    if pending.count:
+        return False
+
+    await update_job_status(job_id)
+    return True
+
+
+async def get_files(folder_id: str, user_id: int, recursive: bool = False) -> list[dict]:
     """
     Get all pdf files within the chosen folder
     """
-    credentials = OAuthCredentialsService.from_authorized_user_info(credentials_dict)
-     
-    service = build('drive', 'v3', credentials=credentials)
-    query = f"'{folder_id}' in parents and mimeType = 'application/pdf' and trashed = false"
+    credentials = await OAuthCredentialsService.get_credentials(user_id)
+    return await DriveService(credentials).list_pdf_files(folder_id, recursive)
 
 
-    results = service.files().list(
-        q=query,
-        spaces='drive'
-    ).execute()
+async def intake_files(folder_id: str, user_id: int, job_id: int, recursive: bool = False) -> dict[str, int]:
+    """
+    Register the pdf files within the chosen folder as each listing page arrives
+    """
+    credentials = await OAuthCredentialsService.get_credentials(user_id)
+    resume_job_ids = {}
+    async for files in DriveService(credentials).iter_pdf_files(folder_id, recursive):
+        resume_job_ids.update(await register_resumes(files, job_id))
+    return resume_job_ids
 
-    files = results.get('files', [])
-    next_page_token = results.get('nextPageToken')
-    while next_page_token:
-        results = service.files().list(
-            q=query,
-            spaces='drive',
-            pageToken=next_page_token
-        ).execute()
-        files.extend(results.get('files', []))
-        next_page_token = results.get('nextPageToken', None)
 
-    return files
+def needs_scoring(file: dict, resume: dict | None) -> bool:
+    """
+    Whether a Drive file is new, differs from the resume registered for it,
+    or was left failed or pending by an earlier run
+    """
+    if resume is None or resume.get("status") != "scored":
+        return True
+    if file.get("md5Checksum") and resume.get("md5_checksum"):
+        return file["md5Checksum"] != resume["md5_checksum"]
+    return file.get("modifiedTime") != resume.get("modified_time")
+
+
+async def sync_files(folder_id: str, user_id: int, job_id: int, recursive: bool = False) -> dict[str, int]:
+    """
+    Register only the pdf files that are new or changed since the job last ran,
+    along with the ones the last run did not manage to score.
+    Pending resumes whose file has left the folder are failed, nothing would ever score them.
+    """
+    supabase = await supabase_service.get_supabase()
+    existing = (await supabase.table("resumes").select("id, google_id, status, md5_checksum, modified_time").eq("job_id", job_id).execute()).data
+    resumes_by_google_id = {resume["google_id"]: resume for resume in existing}
+
+    credentials = await OAuthCredentialsService.get_credentials(user_id)
+    resume_job_ids = {}
+    listed = set()
+    async for files in DriveService(credentials).iter_pdf_files(folder_id, recursive):
+        listed.update(file["id"] for file in files)
+        changed = [file for file in files if needs_scoring(file, resumes_by_google_id.get(file["id"]))]
+        if changed:
+            resume_job_ids.update(await register_resumes(changed, job_id))
+
+    # Otherwise they hold the job pending forever, see complete_job_if_done
+    removed = [
+        resume["id"]
+        for google_id, resume in resumes_by_google_id.items()
+        if google_id not in listed and resume["status"] == "pending"
+    ]
+    for start in range(0, len(removed), RESUME_INSERT_CHUNK_SIZE):
+        await supabase.table("resumes").update({
+            "status": "failed"
+        }).in_("id", removed[start:start + RESUME_INSERT_CHUNK_SIZE]).eq("status", "pending").execute()
+    return resume_job_ids
 
 
 
 @inngest_client.create_function(
     fn_id="score-resume",
     trigger=inngest.TriggerEvent(event="app/score-resume"),
-    on_failure=kill_resume_job
+    on_failure=kill_resume_job,
+    concurrency=[
+        inngest.Concurrency(limit=SCORE_RESUME_JOB_CONCURRENCY, key="event.data.job_id"),
+        inngest.Concurrency(limit=SCORE_RESUME_USER_CONCURRENCY, key="event.data.user_id"),
+    ],
 )
 async def score_resume(ctx: inngest.Context) -> None:
     """
@@ -200,29 +483,106 @@ async def score_resume(ctx: inngest.Context) -> None:
     file_id = ctx.event.data["file_id"]
     resume_job_id = ctx.event.data["resume_job_id"]
     job_id = ctx.event.data["job_id"]
-    credentials_dict = ctx.event.data["credentials_dict"]
-    
-    # Download the resume to GCS bucket
-    await ctx.step.run(
-        "download-resume",
-        download_resume,
-        file_id,
-        credentials_dict,
-        resume_job_id
-    )
+    user_id = ctx.event.data["user_id"]
+    # Every step of the resume, and the worker stages they call, share one trace
+    trace = {
+        "trace_id": trace_id_for("resume", resume_job_id),
+        "attributes": {"job.id": job_id, "resume_job.id": resume_job_id},
+    }
+
+    if SCORE_PIPELINE == "fused":
+        # Download, extract and score in a single pass
+        await run_traced_step(
+            ctx,
+            "process-resume",
+            process_resume,
+            file_id,
+            resume_job_id,
+            user_id,
+            **trace,
+        )
+    else:
+        # Download the resume to GCS bucket
+        await run_traced_step(
+            ctx,
+            "download-resume",
+            download_resume,
+            file_id,
+            resume_job_id,
+            user_id,
+            **trace,
+        )
 
-    # Generate the score
-    await ctx.step.run(
-        "generate-score",
-        generate_score,
-        resume_job_id
-    )
+        # Generate the score
+        await run_traced_step(
+            ctx,
+            "generate-score",
+            generate_score,
+            resume_job_id,
+            **trace,
+        )
 
     # Update the resume status
-    await ctx.step.run(
+    await run_traced_step(
+        ctx,
         "update-resume-status",
         update_resume_status,
-        resume_job_id
+        resume_job_id,
+        **trace,
+    )
+
+    if ctx.event.data.get("track_completion"):
+        await ctx.step.run(
+            "complete-job-if-done",
+            complete_job_if_done,
+            job_id
+        )
+
+
+async def kill_resume_chunk(ctx: inngest.Context) -> None:
+    """
+    Fail the resumes a failed chunk left pending
+    """
+    event_data = ctx.event.data["event"]["data"]
+    supabase = await supabase_service.get_supabase()
+    await supabase.table("resumes").update({
+        "status": "failed"
+    }).in_("id", event_data["resume_job_ids"]).eq("status", "pending").execute()
+    await complete_job_if_done(event_data["job_id"])
+
+
+@inngest_client.create_function(
+    fn_id="score-resume-chunk",
+    trigger=inngest.TriggerEvent(event="app/score-resume-chunk"),
+    on_failure=kill_resume_chunk,
+    concurrency=[
+        inngest.Concurrency(limit=SCORE_CHUNK_JOB_CONCURRENCY, key="event.data.job_id"),
+        inngest.Concurrency(limit=SCORE_CHUNK_USER_CONCURRENCY, key="event.data.user_id"),
+    ],
+)
+async def score_resume_chunk(ctx: inngest.Context) -> None:
+    """
+    Score a chunk of a fan-out job's resumes in one Modal call
+    """
+    resume_job_ids = ctx.event.data["resume_job_ids"]
+    job_id = ctx.event.data["job_id"]
+    user_id = ctx.event.data["user_id"]
+    trace = {"trace_id": trace_id_for("job", job_id), "attributes": {"job.id": job_id}}
+
+    await run_traced_step(
+        ctx,
+        "score-resumes-batch",
+        score_resumes_batch,
+        resume_job_ids,
+        job_id,
+        user_id,
+        **trace,
+    )
+
+    await ctx.step.run(
+        "complete-job-if-done",
+        complete_job_if_done,
+        job_id
     )
 
 
@@ -230,8 +590,8 @@ async def update_resume_status(resume_job_id: int) -> None:
     """
     Update the resume status
     """
-    supabase = supabase_service.get_supabase()
-    supabase.table("resumes").update({
+    supabase = await supabase_service.get_supabase()
+    await supabase.table("resumes").update({
         "status": "scored"
     }).eq("id", resume_job_id).execute()
 
@@ -239,19 +599,20 @@ async def update_resume_status(resume_job_id: int) -> None:
 
 
 
-async def download_resume(file_id: str, credentials_dict: dict, resume_job_id: int) -> str:
+async def download_resume(file_id: str, resume_job_id: int, user_id: int) -> str:
     """
     Download the resume to GCS bucket
     """
 
-    res = requests.post(
+    res = await http_service.post(
         "https://richierish05--prorank-download-resume.modal.run",
         json={
             "file_id": file_id,
-            "credentials_dict": credentials_dict,
-            "resume_job_id": resume_job_id
+            "resume_job_id": resume_job_id,
+            "user_id": user_id,
+            "traceparent": tracer.current_traceparent()
         }
-    )       
+    )
 
     if res.status_code != 200:
         raise HTTPException(status_code=500, detail=f"Error downloading resume: {res.text}")
@@ -261,10 +622,11 @@ async def generate_score(resume_job_id: int) -> str:
     """
     Generate the score
     """
-    res = requests.post(
+    res = await http_service.post(
         "https://richierish05--prorank-score-resume.modal.run",
         json={
-            "resume_job_id": resume_job_id
+            "resume_job_id": resume_job_id,
+            "traceparent": tracer.current_traceparent()
         }
     )
     if res.status_code != 200:
@@ -272,20 +634,136 @@ async def generate_score(resume_job_id: int) -> str:
     return res.json()
 
 
-async def upload_resume_id(file_id: str, job_id: str, file_name: str) -> dict:
+async def process_resume(file_id: str, resume_job_id: int, user_id: int) -> str:
+    """
+    Download, extract and score the resume in one Modal call
+    """
+    res = await http_service.post(
+        "https://richierish05--prorank-process-resume.modal.run",
+        json={
+            "file_id": file_id,
+            "resume_job_id": resume_job_id,
+            "user_id": user_id,
+            "traceparent": tracer.current_traceparent()
+        }
+    )
+    if res.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"Error processing resume: {res.text}")
+    return res.json()
+
+
+async def score_resumes_batch(resume_job_ids: list[int], job_id: int, user_id: int) -> dict:
+    """
+    Extract and score a chunk of resumes in one Modal call, the worker sets their status
+    """
+    res = await http_service.post(
+        "https://richierish05--prorank-score-resumes-batch.modal.run",
+        json={
+            "resume_job_ids": resume_job_ids,
+            "job_id": job_id,
+            "user_id": user_id,
+            "traceparent": tracer.current_traceparent()
+        },
+        timeout=60 * 30
+    )
+    if res.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"Error scoring resumes: {res.text}")
+    return res.json()
+
+
+async def submit_score_batch(job_id: int, user_id: int) -> dict:
+    """
+    Extract the pending resumes of the job and submit them as an OpenAI batch
+    """
+    res = await http_service.post(
+        "https://richierish05--prorank-submit-score-batch.modal.run",
+        json={
+            "job_id": job_id,
+            "user_id": user_id,
+            "traceparent": tracer.current_traceparent()
+        },
+        timeout=60 * 60
+    )
+    if res.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"Error submitting score batch: {res.text}")
+    return res.json()
+
+
+async def collect_score_batch(
+    batch_id: str,
+    job_id: int | None = None,
+    requests: dict[str, list[int]] | None = None,
+    cancel: bool = False,
+    abandon: bool = False,
+) -> dict:
+    """
+    Write back the scores of the batch once it has finished, ask a running batch to cancel,
+    or collect it as it is when abandoned. Resumes left without a score are marked as failed.
+    """
+    res = await http_service.post(
+        "https://richierish05--prorank-collect-score-batch.modal.run",
+        json={
+            "batch_id": batch_id,
+            "job_id": job_id,
+            "requests": requests or {},
+            "cancel": cancel,
+            "abandon": abandon,
+            "traceparent": tracer.current_traceparent()
+        },
+        timeout=60 * 30
+    )
+    if res.status_code != 200:
+        raise HTTPException(status_code=500, detail=f"Error collecting score batch: {res.text}")
+    return res.json()
+
+
+async def upload_resume_id(file_id: str, job_id: str, file_name: str, md5_checksum: str | None = None, modified_time: str | None = None) -> dict:
     """
     Upload the resume id to postgres
     """
-    supabase = supabase_service.get_supabase()
-    resume = supabase.table("resumes").insert({
+    supabase = await supabase_service.get_supabase()
+    resume = (await supabase.table("resumes").insert({
         "google_id": file_id,
         "job_id": job_id,
         "status": "pending",
         "view_url": f"https://drive.google.com/file/d/{file_id}/view",
         "preview_url": f"https://drive.google.com/file/d/{file_id}/preview",
         "file_name": file_name,
-    }).execute().data
+        "md5_checksum": md5_checksum,
+        "modified_time": modified_time,
+    }).execute()).data
 
     return resume[0]
 
 
+async def register_resumes(files: list[dict], job_id: int) -> dict[str, int]:
+    """
+    Register every file as a resume of the job using chunked multi-row upserts.
+    Rows are keyed on (job_id, google_id) so a retried step does not create duplicates.
+    Returns a mapping of google file id to resume id.
+    """
+    supabase = await supabase_service.get_supabase()
+    resume_job_ids = {}
+    for start in range(0, len(files), RESUME_INSERT_CHUNK_SIZE):
+        chunk = files[start:start + RESUME_INSERT_CHUNK_SIZE]
+        resumes = (await supabase.table("resumes").upsert(
+            [
+                {
+                    "google_id": file["id"],
+                    "job_id": job_id,
+                    "status": "pending",
+                    "view_url": f"https://drive.google.com/file/d/{file['id']}/view",
+                    "preview_url": f"https://drive.google.com/file/d/{file['id']}/preview",
+                    "file_name": file["name"],
+                    "md5_checksum": file.get("md5Checksum"),
+                    "modified_time": file.get("modifiedTime"),
+                    # A changed file has to be extracted again
+                    "text_url": None,
+                }
+                for file in chunk
+            ],
+            on_conflict="job_id,google_id",
+        ).execute()).data
+        resume_job_ids.update({resume["google_id"]: resume["id"] for resume in resumes})
+
+    return resume_job_ids
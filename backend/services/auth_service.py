@@ -0,0 +1,131 @@
+"""
+Auth Service - Cookie authentication shared by every route.
+
+Key points:
+- Decoded access tokens and user rows are kept in small bounded TTL caches
+- Token entries never outlive the token's own expiry
+- Logout invalidates the cached entries of the token and its user
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from fastapi import Cookie, HTTPException
+
+from services.jwt_service import JwtService
+from services.supabase_service import SupabaseService
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+# Seconds a decoded token or user row is served from memory
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded least recently used cache whose entries expire after a time to live
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+
+class AuthService:
+
+    _tokens = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+    _users = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+    def __init__(self):
+        self.supabase_service = SupabaseService()
+
+    def verify_token(self, token: Optional[str]) -> Optional[dict]:
+        """
+        Decode an access token, or None if it is missing, invalid or expired
+        """
+        if not token:
+            return None
+        payload = self._tokens.get(token)
+        if payload is not None:
+            return payload
+
+        payload = JwtService.verify_token(token)
+        if payload:
+            self._tokens.set(token, payload, ttl=payload.get("exp", float("inf")) - time.time())
+        return payload
+
+    async def get_user(self, user_id: int) -> Optional[dict]:
+        """
+        Get a user row, or None if the user does not exist
+        """
+        user = self._users.get(user_id)
+        if user is not None:
+            return user
+
+        users = await self.supabase_service.get_user(user_id)
+        if not users:
+            return None
+        self._users.set(user_id, users[0])
+        return users[0]
+
+    def invalidate(self, token: Optional[str]) -> None:
+        """
+        Forget the cached token and user row, called on logout
+        """
+        if not token:
+            return
+        payload = self._tokens.pop(token) or JwtService.verify_token(token)
+        if payload:
+            self._users.pop(payload.get("user_id"))
+
+
+auth_service = AuthService()
+
+
+async def get_user_id(access_token: Optional[str] = Cookie(None)) -> int:
+    """
+    FastAPI dependency returning the id of the authenticated user
+    """
+    payload = auth_service.verify_token(access_token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Unauthorized invalid token")
+    return payload["user_id"]
+
+
+async def get_current_user(access_token: Optional[str] = Cookie(None)) -> dict:
+    """
+    FastAPI dependency returning the row of the authenticated user
+    """
+    user_id = await get_user_id(access_token)
+    user = await auth_service.get_user(user_id)
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized could not find user")
+    return user
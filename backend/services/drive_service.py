@@ -0,0 +1,116 @@
+"""
+Drive Service - Lists the PDF files of a Google Drive folder.
+
+Key points:
+- Pages are requested with the maximum page size and a minimal field mask
+- Subfolders can be crawled recursively, several folders at a time
+- Files are streamed back page by page so intake can start before listing finishes
+"""
+
+import asyncio
+import os
+from typing import AsyncIterator
+
+from google.oauth2.credentials import Credentials
+
+from services.executor_service import run_blocking
+from services.google_api_service import get_service
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+PDF_MIME_TYPE = "application/pdf"
+PAGE_SIZE = 1000
+FILE_FIELDS = "nextPageToken, files(id, name, mimeType, md5Checksum, size, modifiedTime)"
+CRAWL_CONCURRENCY = int(os.getenv("DRIVE_CRAWL_CONCURRENCY", "8"))
+
+
+class DriveService:
+
+    def __init__(self, credentials: Credentials):
+        self.credentials = credentials
+
+    def _list_page(self, folder_id: str, page_token: str | None, include_folders: bool) -> dict:
+        """
+        List one page of the folder's children
+        """
+        mime_filter = f"mimeType = '{PDF_MIME_TYPE}'"
+        if include_folders:
+            mime_filter = f"({mime_filter} or mimeType = '{FOLDER_MIME_TYPE}')"
+
+        query_params = {
+            "q": f"'{folder_id}' in parents and {mime_filter} and trashed = false",
+            "spaces": "drive",
+            "pageSize": PAGE_SIZE,
+            "fields": FILE_FIELDS,
+        }
+        if page_token:
+            query_params["pageToken"] = page_token
+
+        # googleapiclient services are not thread safe, each crawl thread reuses its own
+        service = get_service("drive", "v3", self.credentials)
+        return service.files().list(**query_params).execute()
+
+    async def iter_pdf_files(self, folder_id: str, recursive: bool = False) -> AsyncIterator[list[dict]]:
+        """
+        Yield the PDF files under the folder one page at a time
+        """
+        pages: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(CRAWL_CONCURRENCY)
+        visited = {folder_id}
+        tasks = set()
+        outstanding = 0
+
+        async def crawl(current_folder_id: str) -> None:
+            try:
+                page_token = None
+                while True:
+                    async with semaphore:
+                        page = await run_blocking(self._list_page, current_folder_id, page_token, recursive)
+
+                    files = []
+                    for file in page.get("files", []):
+                        if file.get("mimeType") != FOLDER_MIME_TYPE:
+                            files.append(file)
+                        elif file["id"] not in visited:
+                            visited.add(file["id"])
+                            spawn(file["id"])
+                    if files:
+                        await pages.put(files)
+
+                    page_token = page.get("nextPageToken")
+                    if not page_token:
+                        break
+            except Exception as e:
+                await pages.put(e)
+            finally:
+                await pages.put(None)
+
+        def spawn(current_folder_id: str) -> None:
+            # Counted before the parent crawl signals completion, so the stream cannot end early
+            nonlocal outstanding
+            outstanding += 1
+            task = asyncio.create_task(crawl(current_folder_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        spawn(folder_id)
+        try:
+            while outstanding:
+                page = await pages.get()
+                if page is None:
+                    outstanding -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield page
+        finally:
+            for task in list(tasks):
+                task.cancel()
+
+    async def list_pdf_files(self, folder_id: str, recursive: bool = False) -> list[dict]:
+        """
+        List every PDF file under the folder
+        """
+        files = []
+        async for page in self.iter_pdf_files(folder_id, recursive):
+            files.extend(page)
+        return files
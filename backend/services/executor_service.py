@@ -0,0 +1,28 @@
+"""
+Executor Service - Bounded thread pool for blocking calls made from async code.
+
+Key points:
+- Google API clients (Drive listing, OAuth token exchange and refresh) only have blocking
+  transports, so their calls run here instead of on the event loop
+- The pool is bounded so a large crawl cannot starve the rest of the process of threads
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "32"))
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking function on the shared thread pool and wait for its result
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,64 @@
+"""
+Google API Service - Builds reusable Google API clients.
+
+Key points:
+- Discovery documents come from the copies bundled with googleapiclient and are parsed once per process
+- Clients and their pooled HTTP transports are reused per credential
+- httplib2 transports are not thread safe, so every thread keeps its own clients
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import httplib2
+from google.auth.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import Resource, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+# Clients kept per thread, least recently used credentials are dropped first
+CLIENT_CACHE_SIZE = int(os.getenv("GOOGLE_CLIENT_CACHE_SIZE", "32"))
+HTTP_TIMEOUT = 60
+
+_local = threading.local()
+# build_from_document fills in the parsed document the first time, builds must not race on it
+_build_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_discovery_document(service_name: str, version: str) -> dict:
+    """
+    Get the parsed discovery document bundled with googleapiclient
+    """
+    document = get_static_doc(service_name, version)
+    if document is None:
+        raise ValueError(f"No bundled discovery document for {service_name} {version}")
+    return json.loads(document)
+
+
+def get_service(service_name: str, version: str, credentials: Credentials) -> Resource:
+    """
+    Get a client for the API, reusing this thread's client for the same credentials
+    """
+    clients = getattr(_local, "clients", None)
+    if clients is None:
+        clients = _local.clients = OrderedDict()
+
+    # Keyed by identity, the entry holds on to the credentials so the id is never reused
+    key = (id(credentials), service_name, version)
+    entry = clients.get(key)
+    if entry is not None:
+        clients.move_to_end(key)
+        return entry[1]
+
+    http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    with _build_lock:
+        service = build_from_document(get_discovery_document(service_name, version), http=http)
+
+    clients[key] = (credentials, service)
+    while len(clients) > CLIENT_CACHE_SIZE:
+        clients.popitem(last=False)
+    return service
@@ -0,0 +1,60 @@
+"""
+HTTP Service - Shared async HTTP client for calls to the Modal workers.
+
+Key points:
+- One pooled keep-alive client per process instead of a blocking requests call per step
+- Connect and read timeouts so a stuck worker cannot hold a step forever
+- Failed connection attempts are retried, requests that reached the worker are not,
+  Inngest retries the step instead
+"""
+
+import asyncio
+import os
+from typing import Optional
+
+import httpx
+
+HTTP_CONNECT_RETRIES = int(os.getenv("HTTP_CONNECT_RETRIES", "3"))
+# Seconds to wait for a worker response, long running calls pass their own timeout
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "300"))
+
+
+class HttpService:
+
+    _client: Optional[httpx.AsyncClient] = None
+    _client_lock = asyncio.Lock()
+
+    @classmethod
+    async def get_client(cls) -> httpx.AsyncClient:
+        """
+        Get the shared async HTTP client, creating it on first use
+        """
+        if cls._client is None:
+            async with cls._client_lock:
+                if cls._client is None:
+                    # A custom transport replaces the client's own, so the pool settings go on the transport
+                    transport = httpx.AsyncHTTPTransport(
+                        http2=True,
+                        limits=httpx.Limits(
+                            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+                            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+                            keepalive_expiry=30,
+                        ),
+                        retries=HTTP_CONNECT_RETRIES,
+                    )
+                    cls._client = httpx.AsyncClient(
+                        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=10.0),
+                        # Modal answers long running web calls with a redirect to the pending result
+                        follow_redirects=True,
+                        transport=transport,
+                    )
+        return cls._client
+
+    async def post(self, url: str, json: dict, timeout: Optional[float] = None) -> httpx.Response:
+        """
+        POST a JSON body, optionally with a longer read timeout than the default
+        """
+        client = await self.get_client()
+        if timeout is None:
+            return await client.post(url, json=json)
+        return await client.post(url, json=json, timeout=httpx.Timeout(timeout, connect=10.0))
@@ -0,0 +1,156 @@
+"""
+Job Events Service - Publish/subscribe of job progress fed by Supabase Realtime.
+
+Key points:
+- Events come from the database changes on resumes and jobs, so every backend instance sees
+  the writes of every other instance and of the Modal workers (including the bulk path)
+- Each instance keeps one Realtime channel per job that has subscribers, shared by all of them
+- Subscribers send a snapshot of the job once subscribed, so a missed event never leaves them stale
+- Every subscriber of a job gets its own bounded queue, slow subscribers drop events instead of blocking
+"""
+
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+from services.supabase_service import SupabaseService
+
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+def _changed_record(payload: dict) -> dict | None:
+    """
+    The new row of a Realtime postgres_changes payload
+    """
+    data = payload.get("data", payload)
+    return data.get("record") or data.get("new")
+
+
+def resume_event(resume: dict) -> dict:
+    """
+    Event carrying the status and score of a resume row
+    """
+    return {
+        "type": "resume",
+        "resume_id": resume["id"],
+        "status": resume.get("status"),
+        "score": resume.get("score"),
+    }
+
+
+def job_event(job_id: int, status: str) -> dict:
+    """
+    Event carrying the status of a job
+    """
+    return {
+        "type": "job",
+        "job_id": int(job_id),
+        "status": status,
+    }
+
+
+class JobEventsService:
+
+    _subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+    _channels: dict[int, Any] = {}
+    _channels_lock = asyncio.Lock()
+
+    def __init__(self):
+        self.supabase_service = SupabaseService()
+
+    def _publish(self, job_id: int, event: dict) -> None:
+        """
+        Send an event to every local subscriber of the job
+        """
+        for queue in list(self._subscribers.get(int(job_id), ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass
+
+    def _on_resume_change(self, payload: dict) -> None:
+        resume = _changed_record(payload)
+        if resume and resume.get("job_id") is not None:
+            self._publish(resume["job_id"], resume_event(resume))
+
+    def _on_job_change(self, payload: dict) -> None:
+        job = _changed_record(payload)
+        if job and job.get("id") is not None:
+            self._publish(job["id"], job_event(job["id"], job.get("status")))
+
+    async def _listen(self, job_id: int):
+        """
+        Open a Realtime channel on the resume and job rows of the job
+        """
+        supabase = await self.supabase_service.get_client()
+        channel = supabase.channel(f"job-events-{job_id}")
+        for event in ("INSERT", "UPDATE"):
+            channel.on_postgres_changes(
+                event,
+                schema="public",
+                table="resumes",
+                filter=f"job_id=eq.{job_id}",
+                callback=self._on_resume_change,
+            )
+        channel.on_postgres_changes(
+            "UPDATE",
+            schema="public",
+            table="jobs",
+            filter=f"id=eq.{job_id}",
+            callback=self._on_job_change,
+        )
+        await channel.subscribe()
+        return channel
+
+    async def snapshot(self, job_id: int) -> dict:
+        """
+        Current status of the job and of all its resumes
+        """
+        supabase = await self.supabase_service.get_client()
+        jobs, resumes = await asyncio.gather(
+            supabase.table("jobs").select("id, status").eq("id", job_id).execute(),
+            supabase.table("resumes").select("id, job_id, status, score").eq("job_id", job_id).execute(),
+        )
+        return {
+            "type": "snapshot",
+            "job_id": int(job_id),
+            "status": jobs.data[0]["status"] if jobs.data else None,
+            "resumes": [resume_event(resume) for resume in resumes.data],
+        }
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: int) -> AsyncIterator[asyncio.Queue]:
+        """
+        Receive the events of a job until the context exits.
+        Changes are queued from the moment the channel listens, take the snapshot after entering.
+        """
+        job_id = int(job_id)
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        async with self._channels_lock:
+            self._subscribers[job_id].add(queue)
+            if job_id not in self._channels:
+                try:
+                    self._channels[job_id] = await self._listen(job_id)
+                except Exception:
+                    await self._unsubscribe(job_id, queue)
+                    raise
+
+        try:
+            yield queue
+        finally:
+            async with self._channels_lock:
+                await self._unsubscribe(job_id, queue)
+
+    async def _unsubscribe(self, job_id: int, queue: asyncio.Queue) -> None:
+        """
+        Drop a subscriber, closing the job's channel once nobody listens to it
+        """
+        self._subscribers[job_id].discard(queue)
+        if self._subscribers[job_id]:
+            return
+        del self._subscribers[job_id]
+        channel = self._channels.pop(job_id, None)
+        if channel is not None:
+            supabase = await self.supabase_service.get_client()
+            await supabase.remove_channel(channel)
@@ -7,13 +7,18 @@ Key points:
 - google-auth library automatically refreshes expired access tokens
 - Update stored credentials after refresh (library updates the token dict)
 - Only delete/revoke if refresh fails or user explicitly revokes
+- Live credentials are cached per user and refreshed once (single-flight) shortly before
+  they expire, workers get their access tokens from here instead of refreshing on their own
 """
 
+import asyncio
 import os
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from services.supabase_service import SupabaseService
+from services.executor_service import run_blocking
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
@@ -21,12 +26,21 @@ from google_auth_oauthlib.flow import Flow
 
 load_dotenv()
 
+supabase_service = SupabaseService()
+
 CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI")
 
+# Access tokens are refreshed when they have less than this left to live
+ACCESS_TOKEN_REFRESH_MARGIN = timedelta(seconds=int(os.getenv("ACCESS_TOKEN_REFRESH_MARGIN", "300")))
+
 class OAuthCredentialsService:
 
+    # Live credentials per user and the locks serializing their refresh, shared by every instance
+    _credentials: dict[int, Credentials] = {}
+    _refresh_locks: dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
     @staticmethod
     def get_flow():
         """
@@ -72,16 +86,16 @@ class OAuthCredentialsService:
         token_uri = credentials.token_uri 
         expiry = credentials.expiry  
 
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+        supabase = await supabase_service.get_supabase()
 
         try:
-            user_result = supabase.table("User").select("*").eq("email", email).execute().data
+            user_result = await supabase_service.get_user_by_email(email)
             if not user_result:
-                user_insert = supabase.table("User").insert({
+                user_insert = (await supabase.table("User").insert({
                     "email": email,
                     "picture": picture,
                     "created_at": datetime.now().isoformat()
-                }).execute().data
+                }).execute()).data
                 user = user_insert[0] 
             else:
                 user = user_result[0]
@@ -89,7 +103,7 @@ class OAuthCredentialsService:
             user_id = user['id']
     
             # Check if credentials already exist for this user
-            existing_credentials = supabase.table("OauthCredentials").select("*").eq("user_id", user_id).execute().data
+            existing_credentials = await supabase_service.get_oauth_credentials(user_id)
 
             # Google often only returns a refresh_token on the *first* consent for a given user+client.
             # On subsequent auth flows, credentials.refresh_token may be None — do not overwrite a
@@ -107,15 +121,17 @@ class OAuthCredentialsService:
             
             if existing_credentials and len(existing_credentials) > 0:
                 # Update existing credentials
-                oauth_credentials = supabase.table("OauthCredentials").update(credential_data).eq("user_id", user_id).execute().data
+                oauth_credentials = (await supabase.table("OauthCredentials").update(credential_data).eq("user_id", user_id).execute()).data
             else:
                 # Insert new credentials
-                oauth_credentials = supabase.table("OauthCredentials").insert(credential_data).execute().data
+                oauth_credentials = (await supabase.table("OauthCredentials").insert(credential_data).execute()).data
             
             oauth_credentials = oauth_credentials[0]
             if user['credentials_id'] != oauth_credentials['id']:
-                supabase.table("User").update({"credentials_id": oauth_credentials['id']}).eq("id", user_id).execute()
+                await supabase.table("User").update({"credentials_id": oauth_credentials['id']}).eq("id", user_id).execute()
 
+            # The next lookup picks up the newly stored tokens
+            OAuthCredentialsService._credentials.pop(user_id, None)
             return oauth_credentials
 
         except Exception as e:
@@ -123,12 +139,60 @@ class OAuthCredentialsService:
             return None
     
     @staticmethod
-    async def get_credentials(user_id: int):
+    async def get_credentials(user_id: int) -> Credentials:
         """
-        Get credentials from database
+        Get credentials whose access token is valid for at least the refresh margin.
+        Concurrent callers for the same user wait on a single refresh.
         """
-        credential_data = await OAuthCredentialsService.get_credentials_dict(user_id)
-        return OAuthCredentialsService.from_authorized_user_info(credential_data)
+        credentials = OAuthCredentialsService._credentials.get(user_id)
+        if credentials and not OAuthCredentialsService.needs_refresh(credentials):
+            return credentials
+
+        async with OAuthCredentialsService._refresh_locks[user_id]:
+            # Another caller may have refreshed while we waited for the lock
+            credentials = OAuthCredentialsService._credentials.get(user_id)
+            if credentials and not OAuthCredentialsService.needs_refresh(credentials):
+                return credentials
+
+            credential_data = await OAuthCredentialsService.get_credentials_dict(user_id)
+            credentials = OAuthCredentialsService.from_authorized_user_info(credential_data)
+            if OAuthCredentialsService.needs_refresh(credentials):
+                await run_blocking(credentials.refresh, Request())
+                await OAuthCredentialsService.store_access_token(user_id, credentials)
+
+            OAuthCredentialsService._credentials[user_id] = credentials
+            return credentials
+
+    @staticmethod
+    async def get_access_token(user_id: int) -> dict:
+        """
+        Get a live access token and the number of seconds it stays valid
+        """
+        credentials = await OAuthCredentialsService.get_credentials(user_id)
+        return {
+            "access_token": credentials.token,
+            "expires_in": int((credentials.expiry - datetime.utcnow()).total_seconds()),
+        }
+
+    @staticmethod
+    def needs_refresh(credentials: Credentials) -> bool:
+        """
+        Whether the access token is missing, of unknown age or about to expire
+        """
+        if not credentials.token or credentials.expiry is None:
+            return True
+        return credentials.expiry - ACCESS_TOKEN_REFRESH_MARGIN <= datetime.utcnow()
+
+    @staticmethod
+    async def store_access_token(user_id: int, credentials: Credentials) -> None:
+        """
+        Write a refreshed access token back to the database
+        """
+        supabase = await supabase_service.get_supabase()
+        await supabase.table("OauthCredentials").update({
+            "access_token": credentials.token,
+            "expiry": credentials.expiry.isoformat() if credentials.expiry else None,
+        }).eq("user_id", user_id).execute()
 
 
     @staticmethod
@@ -136,17 +200,28 @@ class OAuthCredentialsService:
         """
         Get credentials dictionary from database
         """
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
-        user = supabase.table("User").select("*").eq("id", user_id).execute().data
+        user = await supabase_service.get_user(user_id)
         if not user or len(user) == 0:
             raise ValueError(f"No user found for user_id: {user_id}")
 
-        credential_data = supabase.table("OauthCredentials").select("*").eq("user_id", user_id).execute().data
+        credential_data = await supabase_service.get_oauth_credentials(user_id)
         if not credential_data or len(credential_data) == 0:
             raise ValueError(f"No credentials found for user_id: {user_id}")
 
         return credential_data[0]
 
+    @staticmethod
+    def parse_expiry(expiry: Optional[str]) -> Optional[datetime]:
+        """
+        Parse a stored expiry into the naive UTC datetime google-auth expects
+        """
+        if not expiry:
+            return None
+        parsed = datetime.fromisoformat(expiry)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
     @staticmethod
     def from_authorized_user_info(credentials_dict: dict) -> Credentials:
         """
@@ -154,6 +229,7 @@ class OAuthCredentialsService:
         """
         return Credentials(
             token=credentials_dict["access_token"],
+            expiry=OAuthCredentialsService.parse_expiry(credentials_dict.get("expiry")),
             refresh_token=credentials_dict["refresh_token"],
             token_uri=credentials_dict["token_uri"],
             client_id=CLIENT_ID,
@@ -1,89 +1,289 @@
-from supabase import create_client, Client
+import asyncio
+import base64
+import json
 import os
+from typing import Optional
+
+import httpx
 from dotenv import load_dotenv
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
 
 load_dotenv()
 
+# Columns that can be projected when listing resumes
+RESUME_COLUMNS = {
+    "id", "created_at", "job_id", "score", "gpa", "num_internships", "status", "preview_url",
+    "candidate_name", "google_id", "text_url", "view_url", "school_year", "file_name",
+    "gpa_contribution", "experience_contribution", "impact_quality_contribution",
+    "prompt_tokens", "cached_prompt_tokens", "completion_tokens", "input_tokens_saved",
+}
+
+# Columns the job page lists, the rest of a resume is loaded on its own page
+RESUME_LIST_COLUMNS = ["id", "file_name", "score", "gpa", "num_internships", "school_year", "status"]
+
+# Percentiles estimated from the score histogram of a job
+STAT_PERCENTILES = (25, 50, 75, 90)
+HISTOGRAM_BUCKET_WIDTH = 10
+
+
+def job_stats_from_aggregate(aggregate: dict) -> dict:
+    """
+    Build the dashboard statistics from a job_score_stats row
+    """
+    num_with_score = aggregate.get("num_with_score", 0)
+    histogram = aggregate.get("histogram") or [0] * 10
+
+    percentiles = {}
+    for percentile in STAT_PERCENTILES:
+        if not num_with_score:
+            percentiles[f"p{percentile}"] = 0
+            continue
+        # Interpolate linearly inside the bucket holding the percentile rank
+        rank = num_with_score * percentile / 100
+        seen = 0
+        for bucket, count in enumerate(histogram):
+            if count and seen + count >= rank:
+                percentiles[f"p{percentile}"] = round(bucket * HISTOGRAM_BUCKET_WIDTH + HISTOGRAM_BUCKET_WIDTH * (rank - seen) / count)
+                break
+            seen += count
+
+    return {
+        "num_resumes": num_with_score,
+        "average_score": round(float(aggregate["score_sum"]) / num_with_score) if num_with_score else 0,
+        "high_score": aggregate.get("score_max") or 0,
+        "lowest_score": aggregate.get("score_min") or 0,
+        "num_pending": aggregate.get("num_pending", 0),
+        "num_scored": aggregate.get("num_scored", 0),
+        "num_failed": aggregate.get("num_failed", 0),
+        "histogram": histogram,
+        "percentiles": percentiles,
+        "tokens": {
+            "prompt_tokens": aggregate.get("prompt_tokens", 0),
+            "cached_prompt_tokens": aggregate.get("cached_prompt_tokens", 0),
+            "completion_tokens": aggregate.get("completion_tokens", 0),
+        },
+    }
+
+
+class InvalidCursorError(ValueError):
+    """
+    Raised for a resume page cursor that was not issued by get_resumes_page
+    """
+
+
+def encode_cursor(score: Optional[float], resume_id: int) -> str:
+    """
+    Opaque keyset cursor after the row with this score and id
+    """
+    return base64.urlsafe_b64encode(json.dumps({"score": score, "id": resume_id}).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[float], int]:
+    """
+    Score and id of the row a cursor points after
+    """
+    try:
+        last = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        score = float(last["score"]) if last["score"] is not None else None
+        return score, int(last["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(str(e)) from e
+
+
 class SupabaseService:
+    """
+    Async data access layer backed by one process-wide Supabase client.
+    Every SupabaseService instance shares the same pooled, keep-alive HTTP/2 connection
+    so requests skip the TLS handshake and never block the event loop.
+    """
 
-    def __init__(self):
-        self.supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_ROLE_KEY"))
+    _client: Optional[AsyncClient] = None
+    _client_lock = asyncio.Lock()
+
+    @classmethod
+    async def get_client(cls) -> AsyncClient:
+        """
+        Get the shared async supabase client, creating it on first use
+        """
+        if cls._client is None:
+            async with cls._client_lock:
+                if cls._client is None:
+                    http_client = httpx.AsyncClient(
+                        http2=True,
+                        limits=httpx.Limits(
+                            max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", "100")),
+                            max_keepalive_connections=int(os.getenv("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", "20")),
+                            keepalive_expiry=30,
+                        ),
+                        timeout=httpx.Timeout(30.0, connect=5.0),
+                    )
+                    cls._client = await acreate_client(
+                        os.getenv("SUPABASE_URL"),
+                        os.getenv("SUPABASE_SERVICE_ROLE_KEY"),
+                        options=AsyncClientOptions(httpx_client=http_client),
+                    )
+        return cls._client
 
-    def get_supabase(self):
+    async def get_supabase(self) -> AsyncClient:
         """
         Get the supabase client
         """
-        return self.supabase
-    
-    def get_user(self, user_id: int):
+        return await self.get_client()
+
+    async def get_user(self, user_id: int):
         """
         Get a certain user
         """
-        return self.supabase.table("User").select("*").eq("id", user_id).execute().data
-    
-    def get_resume(self, resume_id: int):
+        supabase = await self.get_client()
+        return (await supabase.table("User").select("*").eq("id", user_id).execute()).data
+
+    async def get_user_by_email(self, email: str):
+        """
+        Get a certain user by email
+        """
+        supabase = await self.get_client()
+        return (await supabase.table("User").select("*").eq("email", email).execute()).data
+
+    async def get_resume(self, resume_id: int):
         """
-        Get a certain resume    
+        Get a certain resume
         """
-        return self.supabase.table("resumes").select("*").eq("id", resume_id).execute().data
-    
-    def get_job(self, job_id: int):
+        supabase = await self.get_client()
+        return (await supabase.table("resumes").select("*").eq("id", resume_id).execute()).data
+
+    async def get_job(self, job_id: int):
         """
         Get a certain job
         """
-        return self.supabase.table("jobs").select("*").eq("id", job_id).execute().data
-    
-    def get_oauth_credentials(self, user_id: int):
+        supabase = await self.get_client()
+        return (await supabase.table("jobs").select("*").eq("id", job_id).execute()).data
+
+    async def get_oauth_credentials(self, user_id: int):
         """
         Get the OAuth credentials for a certain user
         """
-        return self.supabase.table("OauthCredentials").select("*").eq("user_id", user_id).execute().data
-    
+        supabase = await self.get_client()
+        return (await supabase.table("OauthCredentials").select("*").eq("user_id", user_id).execute()).data
+
 
-    def get_jobs_under_user(self, user_id: int):
+    async def get_jobs_under_user(self, user_id: int):
         """
         Get all jobs under a certain user
         """
-        return self.supabase.table("jobs").select("*").eq("user_id", user_id).execute().data
-    
-    def get_resumes_under_job(self, job_id: int):
-        """
-        Get all resumes under a certain job along with score statistics
-        """
-        # Get all resumes
-        resumes = self.supabase.table("resumes").select("*").eq("job_id", job_id).execute().data
-        job = self.supabase.table("jobs").select("*").eq("id", job_id).execute().data[0]
-        
-        # Get statistics using RPC function
-        stats_result = self.supabase.rpc('get_resume_score_stats', {'p_job_id': job_id}).execute()
-        # Extract statistics from the result
-        stats = stats_result.data
-        num_resumes = stats.get("count", 0)
-        average_score = round(float(stats.get("avg", 0))) if stats.get("avg") else 0
-        high_score = stats.get("max", 0) if stats.get("max") else 0
-        lowest_score = stats.get("min", 0) if stats.get("min") else 0
-        
+        supabase = await self.get_client()
+        return (await supabase.table("jobs").select("*").eq("user_id", user_id).execute()).data
+
+    async def get_job_stats(self, job_id: int):
+        """
+        Get the score statistics of a certain job from its incrementally maintained aggregate
+        """
+        supabase = await self.get_client()
+        rows = (await supabase.table("job_score_stats").select("*").eq("job_id", job_id).execute()).data
+        return job_stats_from_aggregate(rows[0] if rows else {})
+
+    async def get_job_timings(self, job_id: int):
+        """
+        Get the p50, p95 and p99 latency of every pipeline stage of a certain job
+        """
+        supabase = await self.get_client()
+        return (await supabase.table("job_stage_latency").select("*").eq("job_id", job_id).order("service").order("stage").execute()).data
+
+    async def get_resumes_under_job(
+        self,
+        job_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        search: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+    ):
+        """
+        Get the first page of resumes under a certain job along with the job and its score statistics.
+        Later pages come from get_resumes_page with the returned cursor.
+        """
+        supabase = await self.get_client()
+
+        # Get the page, the job and its statistics concurrently
+        page, job_result, stats = await asyncio.gather(
+            self.get_resumes_page(job_id, limit=limit, cursor=cursor, search=search, columns=columns or RESUME_LIST_COLUMNS),
+            supabase.table("jobs").select("name, created_at").eq("id", job_id).execute(),
+            self.get_job_stats(job_id),
+        )
+        job = job_result.data[0]
+
         return {
-            "resumes": resumes,
-            "stats": {
-                "num_resumes": num_resumes,
-                "average_score": average_score,
-                "high_score": high_score,
-                "lowest_score": lowest_score
-            },
+            "resumes": page["resumes"],
+            "next_cursor": page["next_cursor"],
+            "stats": stats,
             "job_name": job.get("name", "Unnamed Job"),
             "job_date": job.get("created_at"),
         }
 
-    def get_resumes_under_user(self, user_id: int):
+    async def get_resumes_page(
+        self,
+        job_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        descending: bool = True,
+        status: Optional[str] = None,
+        school_year: Optional[str] = None,
+        min_gpa: Optional[float] = None,
+        max_gpa: Optional[float] = None,
+        min_internships: Optional[int] = None,
+        search: Optional[str] = None,
+        columns: Optional[list[str]] = None,
+    ):
         """
-        Get all resumes that belong to jobs owned by a user
+        Get one page of the resumes under a certain job ordered by (score, id).
+        Pages are addressed with an opaque keyset cursor, so every page costs the same
+        no matter how deep into the job it is.
         """
-        return self.supabase.table('resumes').select('*, jobs(*)').eq('jobs.user_id', user_id).execute().data
-    
+        selected = set(columns or RESUME_COLUMNS) & RESUME_COLUMNS
+        # The cursor is built from the score and id of the last row
+        selected |= {"id", "score"}
 
+        supabase = await self.get_client()
+        query = supabase.table("resumes").select(",".join(sorted(selected))).eq("job_id", job_id)
 
+        if status:
+            query = query.eq("status", status)
+        if school_year:
+            query = query.eq("school_year", school_year)
+        if min_gpa is not None:
+            query = query.gte("gpa", min_gpa)
+        if max_gpa is not None:
+            query = query.lte("gpa", max_gpa)
+        if min_internships is not None:
+            query = query.gte("num_internships", min_internships)
+        if search and search.strip():
+            query = query.ilike("file_name", f"%{search.strip()}%")
 
+        # Postgres puts null scores first when descending and last when ascending
+        if cursor:
+            score, last_id = decode_cursor(cursor)
+            if descending and score is None:
+                query = query.or_(f"score.not.is.null,and(score.is.null,id.lt.{last_id})")
+            elif descending:
+                query = query.or_(f"score.lt.{score},and(score.eq.{score},id.lt.{last_id})")
+            elif score is None:
+                query = query.is_("score", "null").gt("id", last_id)
+            else:
+                query = query.or_(f"score.gt.{score},and(score.eq.{score},id.gt.{last_id}),score.is.null")
 
+        resumes = (await query.order("score", desc=descending).order("id", desc=descending).limit(limit + 1).execute()).data
 
+        next_cursor = None
+        if len(resumes) > limit:
+            resumes = resumes[:limit]
+            next_cursor = encode_cursor(resumes[-1]["score"], resumes[-1]["id"])
 
+        return {
+            "resumes": resumes,
+            "next_cursor": next_cursor,
+        }
+
+    async def get_resumes_under_user(self, user_id: int):
+        """
+        Get all resumes that belong to jobs owned by a user
+        """
+        supabase = await self.get_client()
+        return (await supabase.table('resumes').select('*, jobs(*)').eq('jobs.user_id', user_id).execute()).data
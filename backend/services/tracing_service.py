@@ -0,0 +1,244 @@
+"""
+Tracing Service - Timing spans around the pipeline stages, exported as OpenTelemetry (OTLP/JSON) traces.
+
+Key points:
+- All spans of a resume share a trace id derived from its resume_job_id (jobs from their job_id),
+  so the backend's step spans and the workers' stage spans land in the same trace
+- Calls to the workers carry the traceparent of the step span so worker spans nest under it
+- Finished spans are exported in the background, at most every TRACE_EXPORT_INTERVAL seconds, so timing a
+  stage never adds a round trip to it
+- Spans go to a JSON lines file (TRACE_EXPORT=file) or an OTLP/HTTP collector (TRACE_EXPORT=otlp)
+- Spans that belong to a job are also handed to the tracer's stage timings sink for the per-job latency rollups
+- Shared by the backend and the Modal workers (modal/tracing.py links here), so it only depends on httpx
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+# "file", "otlp" or "none", stage timings are recorded for the rollups either way
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(tempfile.gettempdir(), "polaris-traces.jsonl"))
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+STAGE_TIMINGS_ENABLED = os.getenv("STAGE_TIMINGS_ENABLED", "true") == "true"
+# Seconds finished spans are buffered before they are exported together
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "2"))
+# Attributes a child span copies from its parent so every span can be rolled up per job
+INHERITED_ATTRIBUTES = ("job.id", "resume_job.id")
+
+
+def trace_id_for(kind: str, id) -> str:
+    """
+    Deterministic 128 bit trace id of a resume or a job, the same in the backend and the workers.
+    """
+    return hashlib.sha256(f"{kind}:{id}".encode("utf-8")).hexdigest()[:32]
+
+
+def parse_traceparent(traceparent: str | None) -> tuple[str, str] | None:
+    """
+    Trace id and parent span id of a W3C traceparent header, None if it is malformed.
+    """
+    parts = (traceparent or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    start_ns: int
+    attributes: dict = field(default_factory=dict)
+    end_ns: int = 0
+    error: str | None = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class Tracer:
+    """
+    Creates spans for the current context and exports them in the background.
+    Stage timing rows go to record_stage_timings, an async callable taking the rows.
+    """
+
+    def __init__(self, service_name: str, record_stage_timings: Optional[Callable[[list[dict]], Awaitable[None]]] = None):
+        self.service_name = os.getenv("OTEL_SERVICE_NAME", service_name)
+        self.record_stage_timings = record_stage_timings
+        self._current: contextvars.ContextVar[Span | None] = contextvars.ContextVar(f"{service_name}_span", default=None)
+        self._finished: list[Span] = []
+        self._export_task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @contextmanager
+    def span(self, name: str, trace_id: str | None = None, traceparent: str | None = None, attributes: dict | None = None):
+        """
+        Times the enclosed block. Nests under the current span unless a different trace or a remote parent is given.
+        """
+        parent = self._current.get()
+        remote_parent = parse_traceparent(traceparent)
+        if remote_parent:
+            trace_id, parent_span_id = remote_parent
+        elif parent is not None and trace_id in (None, parent.trace_id):
+            trace_id, parent_span_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_span_id = trace_id or secrets.token_hex(16), None
+
+        inherited = {}
+        if parent is not None and parent.trace_id == trace_id:
+            inherited = {key: parent.attributes[key] for key in INHERITED_ATTRIBUTES if key in parent.attributes}
+
+        span = Span(
+            name=name,
+            trace_id=trace_id,
+            span_id=secrets.token_hex(8),
+            parent_span_id=parent_span_id,
+            start_ns=time.time_ns(),
+            attributes={**inherited, **(attributes or {})},
+        )
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            self._current.reset(token)
+            self._finished.append(span)
+            self._schedule_export()
+
+    def _schedule_export(self) -> None:
+        """
+        Start a delayed export unless one is pending. Spans ending in worker threads are picked up
+        by the next export scheduled from the event loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = self._export_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._export_task = loop.create_task(self._export_later())
+
+    async def _export_later(self) -> None:
+        await asyncio.sleep(TRACE_EXPORT_INTERVAL)
+        await self.flush()
+
+    def current_span(self) -> Span | None:
+        """
+        Span of the current context, None outside of any span
+        """
+        return self._current.get()
+
+    def current_traceparent(self) -> str | None:
+        """
+        Traceparent of the current span, to send along with outgoing requests.
+        """
+        span = self._current.get()
+        return span.traceparent() if span else None
+
+    def _otlp_payload(self, spans: list[Span]) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": "prorank"}, "spans": [span.to_otlp() for span in spans]}],
+            }]
+        }
+
+    def _write_file(self, payload: dict) -> None:
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload) + "\n")
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=2.0))
+        return self._client
+
+    async def flush(self) -> list[Span]:
+        """
+        Exports every finished span and records their stage timings, returning the spans.
+        Failures are logged and never reach the caller.
+        """
+        spans, self._finished = self._finished, []
+        if not spans:
+            return spans
+
+        try:
+            if TRACE_EXPORT == "file":
+                await asyncio.to_thread(self._write_file, self._otlp_payload(spans))
+            elif TRACE_EXPORT == "otlp":
+                await self._get_client().post(f"{OTLP_ENDPOINT.rstrip('/')}/v1/traces", json=self._otlp_payload(spans))
+        except Exception as e:
+            print(f"Failed to export {len(spans)} spans: {e}")
+
+        rows = self.stage_timings(spans)
+        if rows and STAGE_TIMINGS_ENABLED and self.record_stage_timings is not None:
+            try:
+                await self.record_stage_timings(rows)
+            except Exception as e:
+                print(f"Failed to record {len(rows)} stage timings: {e}")
+        return spans
+
+    def stage_timings(self, spans: list[Span]) -> list[dict]:
+        """
+        Rows for the stage_timings table, one per span that belongs to a job.
+        """
+        return [
+            {
+                "job_id": span.attributes["job.id"],
+                "resume_job_id": span.attributes.get("resume_job.id"),
+                "service": self.service_name,
+                "stage": span.name,
+                "duration_ms": round(span.duration_ms, 3),
+                "failed": span.error is not None,
+                "trace_id": span.trace_id,
+            }
+            for span in spans
+            if span.attributes.get("job.id") is not None
+        ]
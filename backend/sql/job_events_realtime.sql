@@ -0,0 +1,17 @@
+-- The job event stream listens to resume and job changes through Supabase Realtime,
+-- which only broadcasts tables in the supabase_realtime publication.
+
+do $$
+declare
+    v_table text;
+begin
+    foreach v_table in array array['resumes', 'jobs'] loop
+        if not exists (
+            select 1 from pg_publication_tables
+            where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = v_table
+        ) then
+            execute format('alter publication supabase_realtime add table public.%I', v_table);
+        end if;
+    end loop;
+end
+$$;
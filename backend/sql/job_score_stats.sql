@@ -0,0 +1,122 @@
+-- Per-resume OpenAI token usage, written with each score
+alter table resumes add column if not exists prompt_tokens integer not null default 0;
+alter table resumes add column if not exists cached_prompt_tokens integer not null default 0;
+alter table resumes add column if not exists completion_tokens integer not null default 0;
+-- Estimated input tokens removed by resume text compaction
+alter table resumes add column if not exists input_tokens_saved integer not null default 0;
+
+-- Per-job resume aggregates, maintained incrementally by a trigger on resumes.
+-- Every score written by the Modal workers and every status change (scored, failed)
+-- applies the delta between the old and new row, so reading a job's stats is O(1).
+
+create table if not exists job_score_stats (
+    job_id bigint primary key references jobs(id) on delete cascade,
+    num_pending integer not null default 0,
+    num_scored integer not null default 0,
+    num_failed integer not null default 0,
+    num_with_score integer not null default 0,
+    score_sum numeric not null default 0,
+    score_min numeric,
+    score_max numeric,
+    -- Number of scores in [0, 10), [10, 20), ..., [90, 100]
+    histogram integer[] not null default array_fill(0, array[10]),
+    prompt_tokens bigint not null default 0,
+    cached_prompt_tokens bigint not null default 0,
+    completion_tokens bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+create or replace function job_score_bucket(p_score numeric) returns integer
+language sql immutable as $$
+    select least(greatest(floor(p_score / 10)::integer, 0), 9) + 1
+$$;
+
+drop function if exists adjust_job_score_stats(bigint, text, numeric, integer);
+
+create or replace function adjust_job_score_stats(p_job_id bigint, p_resume resumes, p_sign integer)
+returns void language plpgsql as $$
+declare
+    v_status text := p_resume.status;
+    v_score numeric := p_resume.score;
+begin
+    insert into job_score_stats (job_id) values (p_job_id) on conflict (job_id) do nothing;
+
+    update job_score_stats set
+        num_pending = num_pending + case when v_status = 'pending' then p_sign else 0 end,
+        num_scored = num_scored + case when v_status = 'scored' then p_sign else 0 end,
+        num_failed = num_failed + case when v_status = 'failed' then p_sign else 0 end,
+        prompt_tokens = prompt_tokens + p_resume.prompt_tokens * p_sign,
+        cached_prompt_tokens = cached_prompt_tokens + p_resume.cached_prompt_tokens * p_sign,
+        completion_tokens = completion_tokens + p_resume.completion_tokens * p_sign,
+        updated_at = now()
+    where job_id = p_job_id;
+
+    if v_score is not null then
+        update job_score_stats set
+            num_with_score = num_with_score + p_sign,
+            score_sum = score_sum + v_score * p_sign,
+            score_min = case when p_sign > 0 then least(coalesce(score_min, v_score), v_score) else score_min end,
+            score_max = case when p_sign > 0 then greatest(coalesce(score_max, v_score), v_score) else score_max end,
+            histogram[job_score_bucket(v_score)] = histogram[job_score_bucket(v_score)] + p_sign
+        where job_id = p_job_id;
+    end if;
+end
+$$;
+
+create or replace function apply_resume_to_job_score_stats() returns trigger
+language plpgsql as $$
+declare
+    v_stats job_score_stats;
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform adjust_job_score_stats(old.job_id, old, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform adjust_job_score_stats(new.job_id, new, 1);
+    end if;
+
+    -- Min and max cannot be maintained by deltas once a bound is removed (re-scoring, deletes)
+    if old.score is not null
+        and (tg_op = 'DELETE' or new.score is distinct from old.score or new.job_id <> old.job_id) then
+        select * into v_stats from job_score_stats where job_id = old.job_id;
+        if old.score in (v_stats.score_min, v_stats.score_max) then
+            update job_score_stats set (score_min, score_max) = (
+                select min(score), max(score) from resumes where job_id = old.job_id
+            )
+            where job_id = old.job_id;
+        end if;
+    end if;
+
+    return null;
+end
+$$;
+
+drop trigger if exists resumes_job_score_stats on resumes;
+create trigger resumes_job_score_stats
+    after insert or update of job_id, status, score, prompt_tokens, cached_prompt_tokens, completion_tokens or delete on resumes
+    for each row execute function apply_resume_to_job_score_stats();
+
+-- Backfill the aggregates of existing jobs
+insert into job_score_stats (job_id, num_pending, num_scored, num_failed, num_with_score, score_sum, score_min, score_max, histogram, prompt_tokens, cached_prompt_tokens, completion_tokens)
+select
+    r.job_id,
+    count(*) filter (where r.status = 'pending'),
+    count(*) filter (where r.status = 'scored'),
+    count(*) filter (where r.status = 'failed'),
+    count(r.score),
+    coalesce(sum(r.score), 0),
+    min(r.score),
+    max(r.score),
+    array(
+        select count(b.score)::integer
+        from generate_series(1, 10) as bucket
+        left join resumes b on b.job_id = r.job_id and job_score_bucket(b.score) = bucket
+        group by bucket
+        order by bucket
+    ),
+    sum(r.prompt_tokens),
+    sum(r.cached_prompt_tokens),
+    sum(r.completion_tokens)
+from resumes r
+group by r.job_id
+on conflict (job_id) do nothing;
@@ -0,0 +1,9 @@
+-- register_resumes upserts folder listings with on_conflict="job_id,google_id",
+-- which needs a unique index on the pair to infer the conflict target.
+
+-- Earlier runs could register a file twice under one job, keep its first row
+delete from resumes r
+using resumes d
+where r.job_id = d.job_id and r.google_id = d.google_id and r.id > d.id;
+
+create unique index if not exists resumes_job_google_id on resumes (job_id, google_id);
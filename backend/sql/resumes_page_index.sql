@@ -0,0 +1,3 @@
+-- Backs the keyset pagination of get_resumes_page, which orders a job's resumes by (score, id).
+-- Descending to match the default order, Postgres scans it backwards for ascending pages.
+create index if not exists resumes_job_score_id on resumes (job_id, score desc, id desc);
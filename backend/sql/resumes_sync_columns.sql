@@ -0,0 +1,5 @@
+-- Drive version of the file each resume was registered from, compared by incremental syncs
+-- to find new and changed files. modified_time is used when Drive reports no checksum and
+-- is kept as Drive's RFC 3339 string so it compares equal to the listing.
+alter table resumes add column if not exists md5_checksum text;
+alter table resumes add column if not exists modified_time text;
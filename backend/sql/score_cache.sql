@@ -0,0 +1,8 @@
+-- Scores keyed by the hash of the prompt version, compaction version and resume text.
+-- The Modal workers read it before calling OpenAI and upsert every new score into it.
+create table if not exists score_cache (
+    content_hash text primary key,
+    prompt_version text not null,
+    arguments jsonb not null,
+    created_at timestamptz not null default now()
+);
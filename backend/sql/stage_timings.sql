@@ -0,0 +1,32 @@
+-- Duration of every traced pipeline stage, written by the backend steps and the Modal workers
+-- when their spans are flushed. trace_id links a row to the exported OpenTelemetry trace.
+
+create table if not exists stage_timings (
+    id bigserial primary key,
+    job_id bigint not null references jobs(id) on delete cascade,
+    resume_job_id bigint,
+    service text not null,
+    stage text not null,
+    duration_ms double precision not null,
+    failed boolean not null default false,
+    trace_id text,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists stage_timings_job_stage on stage_timings (job_id, service, stage);
+
+-- Per-job latency percentiles of every stage
+create or replace view job_stage_latency as
+select
+    job_id,
+    service,
+    stage,
+    count(*) as samples,
+    count(*) filter (where failed) as failures,
+    avg(duration_ms) as avg_ms,
+    percentile_cont(0.5) within group (order by duration_ms) as p50_ms,
+    percentile_cont(0.95) within group (order by duration_ms) as p95_ms,
+    percentile_cont(0.99) within group (order by duration_ms) as p99_ms,
+    max(duration_ms) as max_ms
+from stage_timings
+group by job_id, service, stage;
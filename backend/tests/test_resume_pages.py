@@ -0,0 +1,176 @@
+import asyncio
+import re
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("supabase")
+
+from services.supabase_service import (  # noqa: E402
+    InvalidCursorError,
+    SupabaseService,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def _value(column, raw):
+    if raw == "null":
+        return None
+    return float(raw) if column == "score" else int(raw)
+
+
+def _condition(expression):
+    """Predicate of one PostgREST filter term, the subset get_resumes_page builds."""
+    if expression.startswith("and(") and expression.endswith(")"):
+        terms = [_condition(term) for term in _split(expression[4:-1])]
+        return lambda row: all(term(row) for term in terms)
+    column, rest = expression.split(".", 1)
+    negate = rest.startswith("not.")
+    operator, raw = (rest[4:] if negate else rest).split(".", 1)
+    value = _value(column, raw)
+    compare = {
+        "is": lambda cell: cell is value,
+        "eq": lambda cell: cell is not None and cell == value,
+        "lt": lambda cell: cell is not None and cell < value,
+        "gt": lambda cell: cell is not None and cell > value,
+    }[operator]
+    return lambda row: compare(row[column]) != negate
+
+
+def _split(expression):
+    """Top level comma separated terms of a PostgREST logical expression."""
+    terms, depth, start = [], 0, 0
+    for i, char in enumerate(expression):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if char == "," and depth == 0:
+            terms.append(expression[start:i])
+            start = i + 1
+    return terms + [expression[start:]]
+
+
+class FakeQuery:
+    """In-memory stand-in for the supabase query builder."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = []
+        self.orders = []
+        self.count = None
+        self.columns = None
+
+    def select(self, columns):
+        self.columns = columns.split(",")
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def is_(self, column, value):
+        self.filters.append(_condition(f"{column}.is.{value}"))
+        return self
+
+    def ilike(self, column, pattern):
+        regex = re.compile(re.escape(pattern).replace("%", ".*"), re.IGNORECASE)
+        self.filters.append(lambda row: regex.fullmatch(row[column] or "") is not None)
+        return self
+
+    def or_(self, expression):
+        terms = [_condition(term) for term in _split(expression)]
+        self.filters.append(lambda row: any(term(row) for term in terms))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    async def execute(self):
+        rows = [row for row in self.rows if all(condition(row) for condition in self.filters)]
+        # Postgres sorts nulls as larger than every value
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: (row[column] is None, row[column] or 0), reverse=desc)
+        rows = [{column: row.get(column) for column in self.columns} for row in rows[: self.count]]
+        return type("Result", (), {"data": rows})()
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        assert name == "resumes"
+        return FakeQuery(self.rows)
+
+
+ROWS = [
+    {"id": i, "job_id": 1, "score": score, "file_name": f"resume_{i}.pdf"}
+    for i, score in enumerate([80.0, None, 95.5, 80.0, None, 60.0, 80.0, None, 95.5, 10.0], start=1)
+]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(SupabaseService, "_client", FakeClient(ROWS))
+    return SupabaseService()
+
+
+def all_pages(service, limit, descending, **filters):
+    async def run():
+        ids, cursor = [], None
+        while True:
+            page = await service.get_resumes_page(
+                1, limit=limit, cursor=cursor, descending=descending, columns=["file_name"], **filters
+            )
+            ids.extend(resume["id"] for resume in page["resumes"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids
+
+    return asyncio.run(run())
+
+
+def ordered_ids(descending):
+    key = lambda row: (row["score"] is None, row["score"] or 0, row["id"])  # noqa: E731
+    return [row["id"] for row in sorted(ROWS, key=key, reverse=descending)]
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(80.5, 7)) == (80.5, 7)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", encode_cursor(1, 2)[:-4], "eyJzY29yZSI6IDF9"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 10, 11])
+def test_pages_visit_every_resume_once_in_order(service, descending, limit):
+    # Page edges fall between, inside and right after the null score rows
+    assert all_pages(service, limit, descending) == ordered_ids(descending)
+
+
+def test_last_page_has_no_cursor(service):
+    page = asyncio.run(service.get_resumes_page(1, limit=len(ROWS)))
+    assert len(page["resumes"]) == len(ROWS)
+    assert page["next_cursor"] is None
+
+
+def test_pages_project_columns_and_keep_cursor_columns(service):
+    page = asyncio.run(service.get_resumes_page(1, limit=2, columns=["file_name", "not_a_column"]))
+    assert all(set(resume) == {"id", "score", "file_name"} for resume in page["resumes"])
+
+
+def test_search_filters_by_file_name(service):
+    assert all_pages(service, 2, True, search="RESUME_1") == [1, 10]
@@ -33,19 +33,13 @@ import {
 } from "lucide-react";
 import { useAuthStore } from "@/app/store/useAuthStore";
 
+// Only the listed columns come with the job page, the resume page loads the rest
 interface Resume {
   id: number;
-  created_at: string;
-  job_id: number;
   score: number | null;
   gpa: number | null;
   num_internships: number | null;
   status: "scored" | "pending" | "failed";
-  preview_url: string | null;
-  candidate_name: string | null;
-  google_id: string;
-  text_url: string | null;
-  view_url: string | null;
   school_year: string | null;
   file_name: string | null;
 }
@@ -57,6 +51,17 @@ interface Stats {
   num_resumes: number;
 }
 
+const PAGE_SIZE = 50;
+const LIST_COLUMNS = [
+  "id",
+  "file_name",
+  "score",
+  "gpa",
+  "num_internships",
+  "school_year",
+  "status",
+];
+
 export default function JobDetailPage() {
   const params = useParams();
   const router = useRouter();
@@ -73,6 +78,8 @@ export default function JobDetailPage() {
   const [jobName, setJobName] = useState("");
   const [jobDate, setJobDate] = useState("");
   const [isRefreshing, setIsRefreshing] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   const handleRefresh = async () => {
     setIsRefreshing(true);
@@ -80,20 +87,34 @@ export default function JobDetailPage() {
     setIsRefreshing(false);
   };
 
-  const fetchResumes = async () => {
+  const resumesQuery = (search: string) => {
+    const query = new URLSearchParams({
+      job_id: String(params.id),
+      limit: String(PAGE_SIZE),
+      columns: LIST_COLUMNS.join(","),
+    });
+    if (search) {
+      query.set("search", search);
+    }
+    return query;
+  };
+
+  const fetchResumes = async (search = searchQuery) => {
     try {
       const response = await fetch(
-        `${process.env.NEXT_PUBLIC_BACKEND_URL}/api/query/get-resumes?job_id=${params.id}`,
+        `${process.env.NEXT_PUBLIC_BACKEND_URL}/api/query/get-resumes?${resumesQuery(search)}`,
         {
           credentials: "include",
         },
       );
       if (!response.ok) {
         setResumes([]);
+        setNextCursor(null);
         return;
       }
       const data = await response.json();
       setResumes(data.resumes);
+      setNextCursor(data.next_cursor);
       setStats(data.stats);
       setJobName(data.job_name);
       setJobDate(
@@ -106,6 +127,31 @@ export default function JobDetailPage() {
     }
   };
 
+  const loadMoreResumes = async () => {
+    if (!nextCursor) {
+      return;
+    }
+    setIsLoadingMore(true);
+    try {
+      const query = resumesQuery(searchQuery);
+      query.set("cursor", nextCursor);
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_BACKEND_URL}/api/query/get-resumes-page?${query}`,
+        {
+          credentials: "include",
+        },
+      );
+      if (!response.ok) {
+        return;
+      }
+      const data = await response.json();
+      setResumes((loaded) => [...loaded, ...data.resumes]);
+      setNextCursor(data.next_cursor);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     const initialize = async () => {
       await fetchUser();
@@ -120,6 +166,15 @@ export default function JobDetailPage() {
     }
   }, [isInitializing, isAuthenticated, router]);
 
+  // Search runs on the server so it covers the resumes that are not loaded yet
+  useEffect(() => {
+    if (isLoading) {
+      return;
+    }
+    const timeout = setTimeout(() => fetchResumes(searchQuery), 300);
+    return () => clearTimeout(timeout);
+  }, [searchQuery]);
+
   if (isInitializing || isLoading || (!isInitializing && !isAuthenticated)) {
     return (
       <div className="flex min-h-screen items-center justify-center bg-background">
@@ -131,12 +186,6 @@ export default function JobDetailPage() {
     );
   }
 
-  const filteredResumes = resumes.filter(
-    (resume) =>
-      resume.file_name?.toLowerCase().includes(searchQuery.toLowerCase()) ??
-      false,
-  );
-
   const getScoreIndicator = (score: number) => {
     if (score >= 85)
       return (
@@ -313,8 +362,8 @@ export default function JobDetailPage() {
                     </TableRow>
                   </TableHeader>
                   <TableBody>
-                    {filteredResumes.length > 0 ? (
-                      filteredResumes.map((resume) => (
+                    {resumes.length > 0 ? (
+                      resumes.map((resume) => (
                         <TableRow key={resume.id} className="cursor-pointer">
                           <TableCell className="font-medium">
                             <Link
@@ -357,6 +406,17 @@ export default function JobDetailPage() {
                   </TableBody>
                 </Table>
               </div>
+              {nextCursor && (
+                <div className="mt-4 flex justify-center">
+                  <Button
+                    variant="outline"
+                    onClick={loadMoreResumes}
+                    disabled={isLoadingMore}
+                  >
+                    {isLoadingMore ? "Loading..." : "Load more"}
+                  </Button>
+                </div>
+              )}
             </CardContent>
           </Card>
         </div>
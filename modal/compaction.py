@@ -0,0 +1,196 @@
+"""
+Resume text normalization and compaction before the text is sent to the model.
+"""
+
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+
+from rate_limiter import CHARS_PER_TOKEN, estimate_tokens
+
+# Bump whenever the compaction rules change, cached scores of the old output are then ignored
+COMPACTION_VERSION = "2"
+MAX_RESUME_TOKENS = int(os.getenv("MAX_RESUME_TOKENS", "3000"))
+# Pages are separated by form feeds in the extracted text
+PAGE_SEPARATOR = "\f"
+# Lines at the top and bottom of a page that can hold running headers and footers
+PAGE_EDGE_LINES = 2
+
+# Only dropped as the first or last line of a page, elsewhere a bare number is content (a graduation year)
+PAGE_NUMBER_PATTERNS = [
+    re.compile(r"^page \d+( of \d+)?$", re.IGNORECASE),
+    re.compile(r"^\d{1,3}( ?/ ?\d{1,3})?$"),
+    re.compile(r"^-+ ?\d{1,3} ?-+$"),
+]
+
+BOILERPLATE_PATTERNS = [
+    re.compile(r"^references (are )?available (up)?on request\.?$", re.IGNORECASE),
+    re.compile(r"^(curriculum vitae|resume|résumé)$", re.IGNORECASE),
+]
+
+# Section headings by how much they matter for scoring, lower sections are dropped first
+SECTION_PRIORITIES = {
+    "education": 3,
+    "experience": 3,
+    "work experience": 3,
+    "professional experience": 3,
+    "internships": 3,
+    "employment": 3,
+    "projects": 2,
+    "leadership": 2,
+    "activities": 2,
+    "skills": 2,
+    "technical skills": 2,
+    "awards": 1,
+    "honors": 1,
+    "certifications": 1,
+    "coursework": 1,
+    "relevant coursework": 1,
+    "summary": 1,
+    "objective": 1,
+    "interests": 0,
+    "hobbies": 0,
+    "publications": 0,
+    "references": 0,
+    "appendix": 0,
+}
+
+
+@dataclass
+class CompactionResult:
+    text: str
+    original_tokens: int
+    compacted_tokens: int
+    truncated: bool
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.compacted_tokens
+
+
+def _normalize_line(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip()
+
+
+def _is_boilerplate(line: str) -> bool:
+    return any(pattern.match(line) for pattern in BOILERPLATE_PATTERNS)
+
+
+def _is_page_number(line: str) -> bool:
+    return any(pattern.match(line) for pattern in PAGE_NUMBER_PATTERNS)
+
+
+def _strip_page_numbers(page: list[str]) -> list[str]:
+    """Drops a page number from the first and last non-blank line of the page."""
+    content = [i for i, line in enumerate(page) if line]
+    edges = {content[0], content[-1]} if content else set()
+    return [line for i, line in enumerate(page) if i not in edges or not _is_page_number(line)]
+
+
+def _page_edges(page: list[str]) -> tuple[set[str], set[str]]:
+    """Top and bottom few non-blank lines of a page."""
+    content = [line for line in page if line]
+    return set(content[:PAGE_EDGE_LINES]), set(content[-PAGE_EDGE_LINES:])
+
+
+def _running_lines(pages: list[list[str]]) -> set[str]:
+    """Short lines repeated at the top of every page, or at the bottom of every page."""
+    edges = [_page_edges(page) for page in pages if any(page)]
+    if len(edges) < 2:
+        return set()
+    headers = set.intersection(*(top for top, _ in edges))
+    footers = set.intersection(*(bottom for _, bottom in edges))
+    return {line for line in headers | footers if len(line) <= 80}
+
+
+def _section_priority(line: str) -> int | None:
+    """Priority of the section a heading line opens, or None if the line is not a heading."""
+    heading = line.strip(" :").lower()
+    return SECTION_PRIORITIES.get(heading)
+
+
+def _clean_lines(text: str) -> list[str]:
+    """Normalizes the text and drops repeated headers/footers, boilerplate and duplicate lines."""
+    text = unicodedata.normalize("NFKC", text)
+    # Join words hyphenated across line breaks
+    text = re.sub(r"(\w)-\n(?=[a-z])", r"\1", text)
+
+    pages = [
+        _strip_page_numbers([_normalize_line(line) for line in page.splitlines()])
+        for page in text.split(PAGE_SEPARATOR)
+    ]
+
+    # Running headers and footers are kept once, on the page they first appear
+    running = _running_lines(pages)
+    lines = []
+    seen_running = set()
+    for page in pages:
+        top, bottom = _page_edges(page)
+        for line in page:
+            if line in running and (line in top or line in bottom):
+                if line in seen_running:
+                    continue
+                seen_running.add(line)
+            if _is_boilerplate(line):
+                continue
+            # Drop blank runs and immediate duplicates
+            if not line and (not lines or not lines[-1]):
+                continue
+            if line and lines and line == lines[-1]:
+                continue
+            lines.append(line)
+
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _split_sections(lines: list[str]) -> list[tuple[int, list[str]]]:
+    """Splits the lines into (priority, lines) sections at known headings."""
+    sections = [(SECTION_PRIORITIES["education"], [])]  # Header with name and contact details
+    for line in lines:
+        priority = _section_priority(line)
+        if priority is not None:
+            sections.append((priority, [line]))
+        else:
+            sections[-1][1].append(line)
+    return [section for section in sections if section[1]]
+
+
+def compact_resume_text(text: str, max_tokens: int = MAX_RESUME_TOKENS) -> CompactionResult:
+    """Normalizes the resume text and fits it into the token budget, dropping low value sections first."""
+    original_tokens = estimate_tokens(text)
+    sections = _split_sections(_clean_lines(text))
+
+    def render() -> str:
+        return "\n".join(line for _, section in sections for line in section)
+
+    compacted = render()
+    truncated = False
+    if estimate_tokens(compacted) > max_tokens:
+        truncated = True
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        length = len(compacted)
+        # Trim the lowest priority sections, latest first, until the text fits
+        order = sorted(range(len(sections)), key=lambda i: (sections[i][0], -i))
+        for index in order:
+            section = sections[index][1]
+            while section and length > max_chars:
+                # Each line is followed by a newline, except the very last one
+                length -= len(section.pop()) + 1
+            if length <= max_chars:
+                break
+        compacted = render()
+
+    result = CompactionResult(
+        text=compacted,
+        original_tokens=original_tokens,
+        compacted_tokens=estimate_tokens(compacted),
+        truncated=truncated,
+    )
+    print(
+        f"Compacted resume from {result.original_tokens} to {result.compacted_tokens} tokens "
+        f"({result.tokens_saved} saved{', truncated' if truncated else ''})"
+    )
+    return result
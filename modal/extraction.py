@@ -0,0 +1,136 @@
+"""
+PDF text extraction engine used by the resume workers.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+
+import fitz
+
+# Documents longer than this are cut off, resumes rarely need more than a few pages
+MAX_PAGES = int(os.getenv("EXTRACTION_MAX_PAGES", "20"))
+# PDFs larger than this are rejected before they are parsed
+MAX_PDF_BYTES = int(os.getenv("EXTRACTION_MAX_PDF_BYTES", str(25 * 1024 * 1024)))
+# Documents with at least this many pages are split across worker processes
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("EXTRACTION_PARALLEL_PAGE_THRESHOLD", "16"))
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+# Documents averaging fewer characters per page than this are treated as scanned and sent to OCR
+MIN_TEXT_CHARS_PER_PAGE = int(os.getenv("EXTRACTION_MIN_TEXT_CHARS_PER_PAGE", "100"))
+OCR_DPI = int(os.getenv("EXTRACTION_OCR_DPI", "300"))
+OCR_LANGUAGE = os.getenv("EXTRACTION_OCR_LANGUAGE", "eng")
+
+_executor: ProcessPoolExecutor | None = None
+
+
+@dataclass
+class ExtractionResult:
+    text: str
+    pages: list[str]
+    page_count: int
+    pages_extracted: int
+    truncated: bool
+    elapsed_ms: float
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """
+    Process pool shared by every extraction in this container.
+    Workers come from a forkserver, forking the threaded worker process itself could deadlock them.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+    return _executor
+
+
+def _extract_page_range(pdf_bytes: bytes, start: int, stop: int) -> list[str]:
+    """Extracts the text of pages [start, stop) of a PDF."""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_document:
+        return [pdf_document[page_num].get_text() for page_num in range(start, stop)]
+
+
+def _check_size(pdf_bytes: bytes) -> None:
+    if len(pdf_bytes) > MAX_PDF_BYTES:
+        raise ValueError(f"PDF is {len(pdf_bytes)} bytes, the limit is {MAX_PDF_BYTES}")
+
+
+def _build_result(pages: list[str], page_count: int, started: float, lane: str) -> ExtractionResult:
+    result = ExtractionResult(
+        # Form feeds keep page boundaries so compaction can spot running headers and footers
+        text="\f".join(pages),
+        pages=pages,
+        page_count=page_count,
+        pages_extracted=len(pages),
+        truncated=len(pages) < page_count,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+    )
+    print(
+        f"Extracted {result.pages_extracted}/{result.page_count} pages "
+        f"({len(result.text)} chars) in {result.elapsed_ms:.1f} ms on the {lane} lane"
+    )
+    return result
+
+
+def extract_pdf_text(pdf_bytes: bytes, max_pages: int = MAX_PAGES, parallel: bool = True) -> ExtractionResult:
+    """Extracts the text of a PDF, splitting large documents across worker processes."""
+    _check_size(pdf_bytes)
+
+    started = time.perf_counter()
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_document:
+        page_count = pdf_document.page_count
+        pages_extracted = min(page_count, max_pages)
+        use_pool = parallel and EXTRACTION_WORKERS > 1 and pages_extracted >= PARALLEL_PAGE_THRESHOLD
+        if not use_pool:
+            pages = [pdf_document[page_num].get_text() for page_num in range(pages_extracted)]
+
+    if use_pool:
+        chunk_size = -(-pages_extracted // EXTRACTION_WORKERS)
+        ranges = [(start, min(start + chunk_size, pages_extracted)) for start in range(0, pages_extracted, chunk_size)]
+        chunks = _get_executor().map(
+            _extract_page_range,
+            [pdf_bytes] * len(ranges),
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges],
+        )
+        pages = [page for chunk in chunks for page in chunk]
+
+    return _build_result(pages, page_count, started, "text")
+
+
+def needs_ocr(result: ExtractionResult) -> bool:
+    """Whether the text layer is too thin to hold the content, as with scanned or image-only PDFs."""
+    if result.pages_extracted == 0:
+        return False
+    chars = sum(len(page.strip()) for page in result.pages)
+    return chars < MIN_TEXT_CHARS_PER_PAGE * result.pages_extracted
+
+
+def ocr_pdf_text(pdf_bytes: bytes, max_pages: int = MAX_PAGES) -> ExtractionResult:
+    """Extracts the text of a PDF by running Tesseract over the rendered pages, needs tesseract installed."""
+    _check_size(pdf_bytes)
+
+    started = time.perf_counter()
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_document:
+        page_count = pdf_document.page_count
+        pages = []
+        for page_num in range(min(page_count, max_pages)):
+            page = pdf_document[page_num]
+            textpage = page.get_textpage_ocr(language=OCR_LANGUAGE, dpi=OCR_DPI, full=True)
+            pages.append(page.get_text(textpage=textpage))
+
+    return _build_result(pages, page_count, started, "ocr")
+
+
+def _extract_serial(pdf_bytes: bytes) -> ExtractionResult:
+    return extract_pdf_text(pdf_bytes, parallel=False)
+
+
+def submit_pdf_text(pdf_bytes: bytes) -> Future:
+    """
+    Extracts a whole PDF on a worker process, so many documents extracted at once use every core.
+    The future resolves to its ExtractionResult.
+    """
+    return _get_executor().submit(_extract_serial, pdf_bytes)
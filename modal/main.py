@@ -4,141 +4,669 @@ Microservice that downloads resumes from Google Drive and scores them using the
 
 import modal
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 import os
 from fastapi import HTTPException
-import io
-import fitz
 from google.cloud import storage
+from google.api_core.exceptions import NotFound
 import json
-from supabase import create_client, Client
-from openai import OpenAI
-from prompts import score_resume_function_schema, SYSTEM_PROMPT
+import asyncio
+import functools
+import hashlib
+import random
+import secrets
+import time
+from collections import defaultdict
+import httpx
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, RateLimitError
+from prompts import score_resume_function_schema, SYSTEM_PROMPT, PROMPT_VERSION
+from extraction import ExtractionResult, extract_pdf_text, needs_ocr, ocr_pdf_text, submit_pdf_text
+from compaction import COMPACTION_VERSION, compact_resume_text
+from google_clients import get_service
+from text_cache import TextCache
+from tracing import Tracer, trace_id_for
+from rate_limiter import LocalLimiterStore, ModalDictStore, RateLimiter, estimate_tokens, retry_after_seconds
 
 APP_NAME = "ProRank"
 app = modal.App(APP_NAME) # Initialize modal app
 
+LOCAL_SOURCES = ("prompts", "extraction", "rate_limiter", "compaction", "google_clients", "text_cache", "tracing")
+
 # Define the docker image
 image = (
     modal.Image.debian_slim()                                  # Start with a Linux image
     .pip_install_from_requirements("requirements.txt")         # Install local python dependencies
-    .add_local_python_source("prompts")                        # Inject local python source into the docker image
+    .add_local_python_source(*LOCAL_SOURCES)                   # Inject local python source into the docker image
+)
+
+# The OCR lane additionally needs Tesseract, PyMuPDF finds its language data through TESSDATA_PREFIX
+ocr_image = (
+    modal.Image.debian_slim()
+    .apt_install("tesseract-ocr", "tesseract-ocr-eng")
+    .env({"TESSDATA_PREFIX": "/usr/share/tesseract-ocr/5/tessdata"})
+    .pip_install_from_requirements("requirements.txt")
+    .add_local_python_source(*LOCAL_SOURCES)
 )
 
 gcp_secrets = modal.Secret.from_name("prorank-secrets")
 gcs_secrets = modal.Secret.from_name("gcp-sa-key")
 
+# Maximum number of in-flight model calls per batch scoring request
+SCORE_BATCH_CONCURRENCY = int(os.getenv("SCORE_BATCH_CONCURRENCY", "8"))
+
+# OpenAI budget shared by every container, set a little below the account limits
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "450"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "25000"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_RATE_LIMIT_RETRIES = 5
+# Connection errors, timeouts and 5xx responses are retried with exponential backoff starting at this many seconds
+OPENAI_RETRY_BACKOFF = 1.0
+# Tokens the model is expected to spend on the score_resume call
+SCORE_COMPLETION_TOKENS = 150
+PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT + json.dumps(score_resume_function_schema))
+
+# Overnight jobs are scored through the OpenAI Batch API, which can point at mock_batch_server.py for testing
+OPENAI_BATCH_BASE_URL = os.getenv("OPENAI_BATCH_BASE_URL")
+BULK_EXTRACTION_CONCURRENCY = int(os.getenv("BULK_EXTRACTION_CONCURRENCY", "16"))
+# Batches in these states produce no further results
+BATCH_TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# Scanned resumes are OCR'd on their own containers so they never hold up the text lane
+OCR_MAX_CONTAINERS = int(os.getenv("OCR_MAX_CONTAINERS", "4"))
+# Per-lane extraction counters, each container writes its own "<lane>:<container>" keys and readers sum them
+lane_metrics = modal.Dict.from_name("prorank-extraction-lanes", create_if_missing=True)
+EXTRACTION_LANES = ("text", "ocr")
+LANE_METRICS_CONTAINER = os.getenv("MODAL_TASK_ID") or secrets.token_hex(8)
+# Seconds a container accumulates its counters for before writing them out
+LANE_METRICS_INTERVAL = float(os.getenv("LANE_METRICS_INTERVAL", "10"))
+
+# Backend endpoint handing out users' Drive access tokens, workers never refresh tokens themselves
+ACCESS_TOKEN_URL = os.getenv("ACCESS_TOKEN_URL")
+# Cached access tokens are fetched again when they have less than this many seconds left
+ACCESS_TOKEN_REFRESH_MARGIN = 60
+
+# "local" keeps the limiter state in memory, useful for tests and local runs
+if os.getenv("RATE_LIMITER_STORE") == "local":
+    rate_limiter_store = LocalLimiterStore()
+else:
+    rate_limiter_store = ModalDictStore(modal.Dict.from_name("prorank-openai-rate-limit", create_if_missing=True))
+
+rate_limiter = RateLimiter(
+    rate_limiter_store,
+    requests_per_minute=OPENAI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=OPENAI_TOKENS_PER_MINUTE,
+    max_concurrency=OPENAI_MAX_CONCURRENCY,
+)
+
+# Container-wide supabase client so warm containers reuse one pooled HTTP/2 connection
+_supabase: AsyncClient | None = None
+_supabase_lock = asyncio.Lock()
+
+
+async def get_supabase() -> AsyncClient:
+    """Get the shared async supabase client, creating it on first use."""
+    global _supabase
+    if _supabase is None:
+        async with _supabase_lock:
+            if _supabase is None:
+                http_client = httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=50, max_keepalive_connections=10, keepalive_expiry=30),
+                    timeout=httpx.Timeout(30.0, connect=5.0),
+                )
+                _supabase = await acreate_client(
+                    os.environ["SUPABASE_URL"],
+                    os.environ["SUPABASE_SERVICE_ROLE_KEY"],
+                    options=AsyncClientOptions(httpx_client=http_client),
+                )
+    return _supabase
+
+
+async def record_stage_timings(rows: list[dict]) -> None:
+    """Writes the stage timings of exported spans, called in the background by the tracer."""
+    supabase = await get_supabase()
+    await supabase.table("stage_timings").insert(rows).execute()
+
+
+# Stage spans of the workers, see tracing.py for the export settings
+tracer = Tracer("prorank-workers", record_stage_timings)
+
+
+def traced_endpoint(name: str):
+    """Runs an endpoint in a root span that continues the caller's trace."""
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(data: dict):
+            trace_id = None
+            if data.get("resume_job_id"):
+                trace_id = trace_id_for("resume", data["resume_job_id"])
+            elif data.get("job_id"):
+                trace_id = trace_id_for("job", data["job_id"])
+            attributes = {
+                attribute: data[key]
+                for key, attribute in (("job_id", "job.id"), ("resume_job_id", "resume_job.id"))
+                if data.get(key) is not None
+            }
+            with tracer.span(name, trace_id=trace_id, traceparent=data.get("traceparent"), attributes=attributes):
+                return await endpoint(data)
+        return wrapper
+    return decorator
+
+
+async def get_resume_row(supabase: AsyncClient, resume_job_id: int) -> dict:
+    """Fetches a resume and tags the current span with its job so its stages roll up per job."""
+    with tracer.span("supabase.get_resume"):
+        resume = (await supabase.table("resumes").select("*").eq("id", resume_job_id).execute()).data[0]
+    span = tracer.current_span()
+    if span is not None:
+        span.set_attribute("job.id", resume["job_id"])
+    return resume
+
+
+def text_cache_key(resume: dict) -> str:
+    """Key of a resume's extracted text, the Drive content checksum so copies share it and edits miss it.
+    Files without a checksum fall back to their file id, the key used before checksums were recorded."""
+    if resume.get("md5_checksum"):
+        return f"md5/{resume['md5_checksum']}"
+    return resume["google_id"]
+
+
+def is_content_addressed(blob_name: str) -> bool:
+    """Whether the blob is keyed by content, such blobs never change once written."""
+    return blob_name.startswith("extracted_text/md5/")
+
+
+def text_blob_name(cache_key: str) -> str:
+    """Name of the GCS blob holding an extracted text."""
+    return f"extracted_text/{cache_key}.txt"
+
+
+def text_url(cache_key: str) -> str:
+    """Public URL of an extracted text."""
+    return f"https://storage.googleapis.com/prorank-extracted-text/{text_blob_name(cache_key)}"
+
+
+# Credentials per user with their expiry time, shared by every request in the container.
+# Reusing the same object lets get_service reuse its Drive clients.
+_user_credentials: dict[int, tuple[Credentials, float]] = {}
+_user_credentials_locks: dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+async def get_user_credentials(user_id: int) -> Credentials:
+    """Gets the user's Drive access token from the backend, at most once per token lifetime per container."""
+    cached = _user_credentials.get(user_id)
+    if cached and cached[1] - ACCESS_TOKEN_REFRESH_MARGIN > time.time():
+        return cached[0]
+
+    async with _user_credentials_locks[user_id]:
+        cached = _user_credentials.get(user_id)
+        if cached and cached[1] - ACCESS_TOKEN_REFRESH_MARGIN > time.time():
+            return cached[0]
+
+        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0)) as client:
+            res = await client.get(
+                ACCESS_TOKEN_URL,
+                params={"user_id": user_id},
+                headers={"X-Internal-Secret": os.environ["INTERNAL_API_SECRET"]},
+            )
+        res.raise_for_status()
+        body = res.json()
+        credentials = Credentials(token=body["access_token"])
+        _user_credentials[user_id] = (credentials, time.time() + body["expires_in"])
+        return credentials
+
+
+async def get_drive_credentials(data: dict) -> Credentials:
+    """Drive credentials of the user a request was made for, resolved through the backend token broker."""
+    user_id = data.get("user_id")
+    if user_id is None:
+        raise HTTPException(status_code=400, detail="User ID not found")
+    return await get_user_credentials(int(user_id))
+
+
+def download_pdf(credentials: Credentials, file_id: str) -> bytes:
+    """Downloads the raw PDF bytes of a Drive file."""
+    with tracer.span("drive.download") as span:
+        drive_service = get_service("drive", "v3", credentials)
+
+        # Download the file content
+        request = drive_service.files().get_media(fileId=file_id)
+        pdf_bytes = request.execute()
+        span.set_attribute("bytes", len(pdf_bytes))
+        return pdf_bytes
+
+
 @app.function(image=image, secrets=[gcp_secrets, gcs_secrets])
 @modal.fastapi_endpoint(
     method="POST",
     docs=True
 )
+@traced_endpoint("worker.download_resume")
 async def download_resume(data: dict):
     resume_job_id = data.get("resume_job_id")
 
     # Get the resume from the database
-    supabase = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
-    resume = supabase.table("resumes").select("*").eq("id", resume_job_id).execute().data[0]
+    supabase = await get_supabase()
+    resume = await get_resume_row(supabase, resume_job_id)
 
     # Check if the text already exists in the database
     if resume["text_url"]:
         return {"success": True, "message": "Text already extracted"}
 
     # Build the storage client and bucket
-    creds = json.loads(os.environ["GOOGLE_APPLICATION_CREDENTIALS_JSON"])
-    storage_client = storage.Client.from_service_account_info(creds)
-    bucket = storage_client.bucket(os.environ["GCS_BUCKET_NAME"])
+    bucket = get_text_bucket()
+    file_id = resume["google_id"]
+    cache_key = text_cache_key(resume)
+    blob_name = text_blob_name(cache_key)
 
-    # Check if the text already exists in GCS
-    blob = bucket.blob(f"extracted_text/{resume['google_id']}.txt")
-    if blob.exists():
+    # Check if the same content was already extracted, possibly from a copy in another folder.
+    # Only content-addressed text is reused, text stored under a file id may predate an edit.
+    if is_content_addressed(blob_name) and await asyncio.to_thread(read_text_blob, blob_name, bucket) is not None:
         # Update the resume in the database with a link to the text
-        supabase.table("resumes").update({
-            "text_url": f"https://storage.googleapis.com/prorank-extracted-text/extracted_text/{resume['google_id']}.txt"
-        }).eq("id", resume_job_id).execute()
+        await link_resume_text(resume_job_id, cache_key)
         return {"success": True, "message": "Text already in blob storage"}
 
-
-    
-    # Build the credentials object to call the Google Drive API
-    credentials = Credentials(    
-        token=data["credentials_dict"]["access_token"],
-        refresh_token=data["credentials_dict"]["refresh_token"],
-        token_uri=data["credentials_dict"]["token_uri"],
-        client_id=os.environ["GOOGLE_CLIENT_ID"],
-        client_secret=os.environ["GOOGLE_CLIENT_SECRET"],
-        scopes=[
-            "openid", 
-            "https://www.googleapis.com/auth/userinfo.email", 
-            "https://www.googleapis.com/auth/userinfo.profile",
-            "https://www.googleapis.com/auth/drive.readonly"
-            ]
-    )
-
-    drive_service = build("drive", "v3", credentials=credentials)
-    file_id = resume["google_id"]
-    
-    # Download the file content
-    request = drive_service.files().get_media(fileId=file_id)
-    file_content = io.BytesIO(request.execute())
-    
-    # Extract text from PDF using PyMuPDF
-    pdf_document = fitz.open(stream=file_content, filetype="pdf")
-    text_content = ""
-    for page_num in range(len(pdf_document)):
-        print(f"Extracting text from page {page_num}")
-        page = pdf_document[page_num]
-        text_content += page.get_text()
-    pdf_document.close()
-
+    credentials = await get_drive_credentials(data)
+    pdf_bytes = await asyncio.to_thread(download_pdf, credentials, file_id)
+    text_content = await extract_resume_text(pdf_bytes)
 
     # Upload the text to GCS
     try:
-        upload_blob_from_memory(storage_client, bucket, text_content, f"extracted_text/{file_id}.txt")
+        await asyncio.to_thread(upload_blob_from_memory, bucket, text_content, blob_name)
         print("Text uploaded to GCS successfully")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload text to GCS: {str(e)}")
 
     # Update the resume in the database with a link to the text
-    supabase = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
-    supabase.table("resumes").update({
-        "text_url": f"https://storage.googleapis.com/prorank-extracted-text/extracted_text/{file_id}.txt"
+    await link_resume_text(resume_job_id, cache_key)
+
+    return {"success": True, "message": "Text extracted successfully"}
+
+
+# This container's lane counters since it started, written out in the background
+_lane_counters = {lane: {"documents": 0, "pages": 0, "seconds": 0.0} for lane in EXTRACTION_LANES}
+_lane_flush_task: asyncio.Task | None = None
+
+
+def record_lane_metrics(lane: str, result: ExtractionResult) -> None:
+    """Adds a document to the container's lane counters, they reach lane_metrics on the next background flush."""
+    global _lane_flush_task
+    counters = _lane_counters[lane]
+    counters["documents"] += 1
+    counters["pages"] += result.pages_extracted
+    counters["seconds"] += result.elapsed_ms / 1000
+    if _lane_flush_task is None or _lane_flush_task.done():
+        _lane_flush_task = asyncio.get_running_loop().create_task(flush_lane_metrics())
+
+
+async def flush_lane_metrics() -> None:
+    """Writes the container's running totals under its own keys, so no two containers ever write the same key."""
+    await asyncio.sleep(LANE_METRICS_INTERVAL)
+    for lane, counters in _lane_counters.items():
+        try:
+            await lane_metrics.put.aio(f"{lane}:{LANE_METRICS_CONTAINER}", dict(counters))
+        except Exception as e:
+            print(f"Failed to record {lane} lane metrics: {e}")
+
+
+@app.function(image=ocr_image, max_containers=OCR_MAX_CONTAINERS, timeout=60 * 10)
+async def ocr_resume(pdf_bytes: bytes, traceparent: str | None = None) -> ExtractionResult:
+    """OCR lane for scanned or image-only resumes."""
+    with tracer.span("extract.ocr", traceparent=traceparent):
+        result = await asyncio.to_thread(ocr_pdf_text, pdf_bytes)
+    record_lane_metrics("ocr", result)
+    return result
+
+
+async def extract_resume_text(pdf_bytes: bytes, many: bool = False) -> str:
+    """
+    Extracts the text of a resume PDF, sending documents without a usable text layer to the OCR lane.
+    Callers extracting many documents at once set many, each document then gets a worker process.
+    """
+    with tracer.span("extract.text"):
+        if many:
+            result = await asyncio.wrap_future(submit_pdf_text(pdf_bytes))
+        else:
+            result = await asyncio.to_thread(extract_pdf_text, pdf_bytes)
+    record_lane_metrics("text", result)
+    if not needs_ocr(result):
+        return result.text
+
+    print(f"Text layer holds {len(result.text.strip())} chars over {result.pages_extracted} pages, sending to OCR")
+    with tracer.span("extract.ocr_lane"):
+        result = await ocr_resume.remote.aio(pdf_bytes, tracer.current_traceparent())
+    if needs_ocr(result):
+        raise ValueError("No usable text found in the PDF, even with OCR")
+    return result.text
+
+
+@app.function(image=image)
+@modal.fastapi_endpoint(
+    method="GET",
+    docs=True
+)
+async def extraction_lane_stats() -> dict:
+    """Throughput of each extraction lane, seconds are summed over documents so rates are per worker."""
+    totals = {lane: {"documents": 0, "pages": 0, "seconds": 0.0} for lane in EXTRACTION_LANES}
+    async for key, counters in lane_metrics.items.aio():
+        lane, _, container = key.partition(":")
+        if lane in totals and container:
+            for name in totals[lane]:
+                totals[lane][name] += counters.get(name, 0)
+
+    stats = {}
+    for lane, lane_stats in totals.items():
+        seconds = lane_stats["seconds"]
+        stats[lane] = {
+            **lane_stats,
+            "documents_per_second": lane_stats["documents"] / seconds if seconds else 0,
+            "pages_per_second": lane_stats["pages"] / seconds if seconds else 0,
+        }
+    return stats
+
+
+@app.function(image=image, secrets=[gcp_secrets, gcs_secrets], retries=3)
+async def persist_resume_text(resume_job_id: int, cache_key: str, text_content: str) -> None:
+    """Uploads extracted text to GCS and links it to the resume, off the scoring critical path."""
+    upload_blob_from_memory(get_text_bucket(), text_content, text_blob_name(cache_key))
+    await link_resume_text(resume_job_id, cache_key)
+
+
+async def link_resume_text(resume_job_id: int, cache_key: str) -> None:
+    """Points the resume at text already stored under its cache key."""
+    supabase = await get_supabase()
+    await supabase.table("resumes").update({
+        "text_url": text_url(cache_key)
     }).eq("id", resume_job_id).execute()
 
 
-    return {"success": True, "message": "Text extracted successfully"}
+async def load_resume_text(resume: dict, credentials: Credentials | None, bucket=None, many: bool = False) -> str:
+    """
+    Returns the resume text, extracting it from Drive and persisting it in the background if needed.
+    many is passed on to extract_resume_text by callers loading many resumes concurrently.
+    """
+    if resume["text_url"]:
+        # Text was extracted by an earlier run
+        return await asyncio.to_thread(download_resume_text, resume["text_url"], bucket)
 
+    # The same content may have been extracted before, possibly from a copy in another folder.
+    # Only content-addressed text is reused, text stored under a file id may predate an edit.
+    cache_key = text_cache_key(resume)
+    blob_name = text_blob_name(cache_key)
+    if is_content_addressed(blob_name):
+        resume_text = await asyncio.to_thread(read_text_blob, blob_name, bucket)
+        if resume_text is not None:
+            await link_resume_text(resume["id"], cache_key)
+            return resume_text
 
-def upload_blob_from_memory(storage_client, bucket, contents, destination_blob_name):
+    pdf_bytes = await asyncio.to_thread(download_pdf, credentials, resume["google_id"])
+    resume_text = await extract_resume_text(pdf_bytes, many)
+    if is_content_addressed(blob_name):
+        await asyncio.to_thread(get_text_cache().put, blob_name, resume_text)
+
+    # Persist the text in the background, scoring does not wait for GCS
+    await persist_resume_text.spawn.aio(resume["id"], cache_key, resume_text)
+    return resume_text
+
+
+@app.function(image=image, secrets=[gcp_secrets, gcs_secrets])
+@modal.fastapi_endpoint(
+    method="POST",
+    docs=True
+)
+@traced_endpoint("worker.process_resume")
+async def process_resume(data: dict) -> dict:
+    """Downloads, extracts and scores a resume in one pass, keeping the text in memory."""
+    resume_job_id = data.get("resume_job_id")
+    if not resume_job_id:
+        raise HTTPException(status_code=400, detail="Resume job ID not found")
+
+    supabase = await get_supabase()
+    client = get_openai_client()
+
+    resume = await get_resume_row(supabase, resume_job_id)
+    with tracer.span("drive.credentials"):
+        credentials = await get_drive_credentials(data)
+    resume_text = await load_resume_text(resume, credentials)
+
+    arguments, usage = await generate_score_cached(supabase, client, resume_text)
+
+    # Update the resume in the database with the score
+    with tracer.span("supabase.write_score"):
+        await supabase.table("resumes").update({**score_columns(arguments), **usage}).eq("id", resume_job_id).execute()
+
+    return {"success": True, "message": "Resume processed successfully"}
+
+
+def upload_blob_from_memory(bucket, contents, destination_blob_name):
     """Uploads a file to the bucket."""
 
-    blob = bucket.blob(destination_blob_name)
-    blob.upload_from_string(
-        contents,
-        content_type="text/plain; charset=utf-8"
-    )
+    with tracer.span("gcs.write"):
+        blob = bucket.blob(destination_blob_name)
+        blob.upload_from_string(
+            contents,
+            content_type="text/plain; charset=utf-8"
+        )
+    if is_content_addressed(destination_blob_name):
+        get_text_cache().put(destination_blob_name, contents)
+
+
+# Container-wide GCS bucket and local text cache, created on first use and kept while the container is warm
+_text_bucket = None
+_text_cache: TextCache | None = None
+
+
+def get_text_bucket():
+    """Gets the bucket holding the extracted resume texts, building the storage client once per container."""
+    global _text_bucket
+    if _text_bucket is None:
+        creds = json.loads(os.environ["GOOGLE_APPLICATION_CREDENTIALS_JSON"])
+        storage_client = storage.Client.from_service_account_info(creds)
+        _text_bucket = storage_client.bucket(os.environ["GCS_BUCKET_NAME"])
+    return _text_bucket
+
 
-def download_resume_text(text_url: str) -> str:
+def get_text_cache() -> TextCache:
+    """Gets the container's on-disk cache of content-addressed texts."""
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = TextCache()
+    return _text_cache
+
+
+def download_resume_text(text_url: str, bucket=None) -> str:
     # Extract blob name from URL
     # URL format: https://storage.googleapis.com/{bucket_name}/{blob_name}
     # We need to extract just the blob_name part
     bucket_name = os.environ["GCS_BUCKET_NAME"]
     blob_name = text_url.split(f"{bucket_name}/", 1)[1] if f"{bucket_name}/" in text_url else text_url
-    
-    creds = json.loads(os.environ["GOOGLE_APPLICATION_CREDENTIALS_JSON"])
-    storage_client = storage.Client.from_service_account_info(creds)
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-    return blob.download_as_text(encoding="utf-8")
 
+    text = read_text_blob(blob_name, bucket)
+    if text is None:
+        raise NotFound(f"Extracted text {blob_name} not found")
+    return text
+
+
+def read_text_blob(blob_name: str, bucket=None) -> str | None:
+    """Reads a stored text in at most one request, None if it does not exist."""
+    content_addressed = is_content_addressed(blob_name)
+    if content_addressed:
+        text = get_text_cache().get(blob_name)
+        if text is not None:
+            return text
+
+    if bucket is None:
+        bucket = get_text_bucket()
+    with tracer.span("gcs.read") as span:
+        try:
+            text = bucket.blob(blob_name).download_as_text(encoding="utf-8")
+        except NotFound:
+            span.set_attribute("found", False)
+            return None
+
+    if content_addressed:
+        get_text_cache().put(blob_name, text)
+    return text
+
+
+# Built once so the tools and system prompt form a byte-identical prefix that OpenAI can cache
+SCORE_TOOLS = [{"type": "function", "function": score_resume_function_schema}]
+SCORE_TOOL_CHOICE = {"type": "function", "function": {"name": "score_resume"}}
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+
+def score_request_body(resume_text: str) -> dict:
+    """Chat completion request asking the model to score the resume text, with the resume text last."""
+    return {
+        "model": "gpt-4o",
+        "temperature": 0,
+        "tools": SCORE_TOOLS,
+        "tool_choice": SCORE_TOOL_CHOICE,
+        "messages": [
+            SYSTEM_MESSAGE,
+            {"role": "user", "content": resume_text}
+        ],
+    }
+
+
+def usage_columns(usage: dict | None) -> dict:
+    """Maps the token usage of a completion onto the resumes table columns."""
+    usage = usage or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "cached_prompt_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "input_tokens_saved": usage.get("input_tokens_saved", 0),
+    }
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether an OpenAI error is worth retrying: connection errors, timeouts, 408, 409 and 5xx."""
+    if isinstance(error, APIConnectionError):  # Includes APITimeoutError
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code in (408, 409) or error.status_code >= 500)
+
+
+async def create_completion(client: AsyncOpenAI, resume_text: str):
+    """
+    Calls the model within the shared rate limits, backing off as long as OpenAI asks on a 429.
+    Transient failures are retried with exponential backoff, outside the limiter so the slot is freed meanwhile.
+    """
+    estimated_tokens = PROMPT_TOKENS + estimate_tokens(resume_text) + SCORE_COMPLETION_TOKENS
+    for attempt in range(OPENAI_RATE_LIMIT_RETRIES):
+        last_attempt = attempt == OPENAI_RATE_LIMIT_RETRIES - 1
+        transient = None
+        async with rate_limiter.limit(estimated_tokens):
+            try:
+                response = await client.chat.completions.create(**score_request_body(resume_text))
+            except RateLimitError as e:
+                if last_attempt:
+                    raise
+                await rate_limiter.record_rate_limited(retry_after_seconds(e.response.headers))
+                continue
+            except (APIConnectionError, APIStatusError) as e:
+                if last_attempt or not is_transient(e):
+                    raise
+                transient = e
+
+        if transient is not None:
+            print(f"OpenAI call failed with {type(transient).__name__}, retrying")
+            await asyncio.sleep(OPENAI_RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1))
+            continue
+        await rate_limiter.record_success()
+        return response
+
+
+# Container-wide OpenAI clients, so warm containers reuse their connection pools
+_openai_client: AsyncOpenAI | None = None
+_batch_openai_client: AsyncOpenAI | None = None
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """OpenAI client whose retries are left to create_completion, which shares 429 back-off with every container."""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"], max_retries=0)
+    return _openai_client
+
+
+async def generate_score(client: AsyncOpenAI, resume_text: str) -> tuple[dict, dict]:
+    """Asks the model to score the compacted resume text and returns the score_resume arguments and token usage."""
+    with tracer.span("compaction"):
+        compaction = compact_resume_text(resume_text)
+    with tracer.span("openai.score"):
+        response = await create_completion(client, compaction.text)
+    usage = usage_columns({
+        **(response.usage.model_dump() if response.usage else {}),
+        "input_tokens_saved": compaction.tokens_saved,
+    })
+    return parse_score_message(response.choices[0].message.model_dump()), usage
+
+
+def parse_score_message(message: dict) -> dict:
+    """Reads the score_resume arguments out of a chat completion message."""
+    if not message.get("tool_calls"):
+        raise HTTPException(status_code=500, detail="Model did not return a tool call")
+
+    arguments = message["tool_calls"][0]["function"]["arguments"]
 
+    if isinstance(arguments, str):
+        arguments = json.loads(arguments)
+    return arguments
 
 
+def score_cache_key(resume_text: str) -> str:
+    """Content hash of the resume text under the current prompt and compaction versions."""
+    return hashlib.sha256(f"{PROMPT_VERSION}:{COMPACTION_VERSION}\n{resume_text}".encode("utf-8")).hexdigest()
 
 
+async def get_cached_scores(supabase: AsyncClient, cache_keys: list[str]) -> dict:
+    """Looks up previously computed score_resume arguments by cache key."""
+    if not cache_keys:
+        return {}
+    rows = (await supabase.table("score_cache").select("content_hash, arguments").in_("content_hash", list(set(cache_keys))).execute()).data
+    return {row["content_hash"]: row["arguments"] for row in rows}
 
 
+async def cache_scores(supabase: AsyncClient, scores: dict) -> None:
+    """Stores score_resume arguments keyed by cache key."""
+    if not scores:
+        return
+    await supabase.table("score_cache").upsert(
+        [
+            {"content_hash": cache_key, "prompt_version": PROMPT_VERSION, "arguments": arguments}
+            for cache_key, arguments in scores.items()
+        ],
+        on_conflict="content_hash",
+    ).execute()
+
+
+async def generate_score_cached(supabase: AsyncClient, client: AsyncOpenAI, resume_text: str) -> tuple[dict, dict]:
+    """Returns the cached score for identical text, only calling the model on a miss."""
+    cache_key = score_cache_key(resume_text)
+    with tracer.span("score_cache.read") as span:
+        cached = await get_cached_scores(supabase, [cache_key])
+        span.set_attribute("hit", cache_key in cached)
+    if cache_key in cached:
+        return cached[cache_key], usage_columns(None)
 
+    arguments, usage = await generate_score(client, resume_text)
+    with tracer.span("score_cache.write"):
+        await cache_scores(supabase, {cache_key: arguments})
+    return arguments, usage
+
+
+def score_columns(arguments: dict) -> dict:
+    """Maps the score_resume arguments onto the resumes table columns."""
+    return {
+        "gpa": arguments["gpa"],
+        "school_year": arguments["school_year"],
+        "num_internships": arguments["number_of_internships"],
+        "score": arguments["score"],
+        "gpa_contribution": arguments["score_breakdown"]["gpa_contribution"],
+        "experience_contribution": arguments["score_breakdown"]["experience_contribution"],
+        "impact_quality_contribution": arguments["score_breakdown"]["impact_quality_contribution"]
+    }
 
 
 @app.function(image=image, secrets=[gcp_secrets, gcs_secrets])
@@ -146,6 +674,7 @@ def download_resume_text(text_url: str) -> str:
     method="POST",
     docs=True
 )
+@traced_endpoint("worker.score_resume")
 async def score_resume(data: dict) -> dict:
     
     resume_job_id = data.get("resume_job_id")
@@ -153,44 +682,304 @@ async def score_resume(data: dict) -> dict:
         raise HTTPException(status_code=400, detail="Resume job ID not found")
 
     # Create clients
-    supabase = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    supabase = await get_supabase()
+    client = get_openai_client()
 
     # Get the resume from the database
-    resume = supabase.table("resumes").select("*").eq("id", resume_job_id).execute().data[0]
-    resume_text = download_resume_text(resume["text_url"])
+    resume = await get_resume_row(supabase, resume_job_id)
+    resume_text = await asyncio.to_thread(download_resume_text, resume["text_url"])
 
+    arguments, usage = await generate_score_cached(supabase, client, resume_text)
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": resume_text}
-        ],
-        functions=[score_resume_function_schema],
-        function_call={"name": "score_resume"}
-    )
+    # Update the resume in the database with the score
+    with tracer.span("supabase.write_score"):
+        await supabase.table("resumes").update({**score_columns(arguments), **usage}).eq("id", resume_job_id).execute()
+
+    return {"success": True, "message": "Resume scored successfully"}
 
-    message = response.choices[0].message
 
-    if not message.function_call:
-        raise HTTPException(status_code=500, detail="Model did not return a function call")
+@app.function(image=image, secrets=[gcp_secrets, gcs_secrets], timeout=60 * 30)
+@modal.fastapi_endpoint(
+    method="POST",
+    docs=True
+)
+@traced_endpoint("worker.score_resumes_batch")
+async def score_resumes_batch(data: dict) -> dict:
+    """
+    Downloads or extracts and scores many resumes in one invocation so client setup and cold start are paid once.
+    Fan-out jobs send their resumes here in chunks, see fan_out_score_resumes in the backend.
+    """
+    resume_job_ids = data.get("resume_job_ids")
+    if not resume_job_ids:
+        raise HTTPException(status_code=400, detail="Resume job IDs not found")
+
+    # Create clients once for the whole batch
+    supabase = await get_supabase()
+    client = get_openai_client()
+    bucket = get_text_bucket()
+
+    # Get every resume in one query
+    resumes = (await supabase.table("resumes").select("*").in_("id", resume_job_ids).execute()).data
+    failed = {
+        resume_job_id: "Resume not found"
+        for resume_job_id in set(resume_job_ids) - {resume["id"] for resume in resumes}
+    }
+
+    extraction_semaphore = asyncio.Semaphore(BULK_EXTRACTION_CONCURRENCY)
+
+    async def load_one(resume: dict) -> str:
+        async with extraction_semaphore:
+            # Drive access is only needed for resumes whose text was not extracted yet
+            credentials = None if resume["text_url"] else await get_drive_credentials(data)
+            return await load_resume_text(resume, credentials, bucket, many=True)
+
+    texts = await asyncio.gather(*(load_one(resume) for resume in resumes), return_exceptions=True)
+
+    downloaded = []
+    for resume, text in zip(resumes, texts):
+        if isinstance(text, Exception):
+            failed[resume["id"]] = str(text)
+        else:
+            downloaded.append((resume, text, score_cache_key(text)))
+
+    # Identical texts are scored once and previously seen texts are not scored at all
+    scores = await get_cached_scores(supabase, [cache_key for _, _, cache_key in downloaded])
+    misses = {cache_key: text for _, text, cache_key in downloaded if cache_key not in scores}
+
+    semaphore = asyncio.Semaphore(SCORE_BATCH_CONCURRENCY)
+
+    async def score_one(text: str) -> tuple[dict, dict]:
+        async with semaphore:
+            return await generate_score(client, text)
+
+    results = await asyncio.gather(*(score_one(text) for text in misses.values()), return_exceptions=True)
+    new_scores = {}
+    usage_by_key = {}
+    for cache_key, result in zip(misses, results):
+        if not isinstance(result, Exception):
+            new_scores[cache_key], usage_by_key[cache_key] = result
+    await cache_scores(supabase, new_scores)
+    scores.update(new_scores)
+    errors = {cache_key: result for cache_key, result in zip(misses, results) if isinstance(result, Exception)}
+
+    rows = []
+    for resume, _, cache_key in downloaded:
+        if cache_key in scores:
+            rows.append({
+                "id": resume["id"],
+                "job_id": resume["job_id"],
+                "google_id": resume["google_id"],
+                "status": "scored",
+                **score_columns(scores[cache_key]),
+                # Tokens are charged to the first resume with this text, duplicates and cache hits cost none
+                **usage_columns(None),
+                **usage_by_key.pop(cache_key, {}),
+            })
+        else:
+            failed[resume["id"]] = str(getattr(errors[cache_key], "detail", errors[cache_key]))
+
+    # Write every score back in a single upsert, taking the rows out of pending
+    if rows:
+        await supabase.table("resumes").upsert(rows, on_conflict="id").execute()
+    if failed:
+        await supabase.table("resumes").update({"status": "failed"}).in_("id", list(failed)).execute()
+
+    return {
+        "success": not failed,
+        "scored": [row["id"] for row in rows],
+        "failed": failed,
+    }
+
+
+def get_batch_openai_client() -> AsyncOpenAI:
+    """OpenAI client used for the Batch API."""
+    global _batch_openai_client
+    if _batch_openai_client is None:
+        _batch_openai_client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"], base_url=OPENAI_BATCH_BASE_URL)
+    return _batch_openai_client
+
+
+@app.function(image=image, secrets=[gcp_secrets, gcs_secrets], timeout=60 * 60)
+@modal.fastapi_endpoint(
+    method="POST",
+    docs=True
+)
+@traced_endpoint("worker.submit_score_batch")
+async def submit_score_batch(data: dict) -> dict:
+    """Extracts every pending resume of a job and submits their scoring as one OpenAI batch."""
+    job_id = data.get("job_id")
+    if not job_id:
+        raise HTTPException(status_code=400, detail="Job ID not found")
+
+    supabase = await get_supabase()
+    client = get_batch_openai_client()
+    bucket = get_text_bucket()
+
+    resumes = (await supabase.table("resumes").select("*").eq("job_id", job_id).eq("status", "pending").execute()).data
+
+    semaphore = asyncio.Semaphore(BULK_EXTRACTION_CONCURRENCY)
+
+    async def load_one(resume: dict) -> str:
+        async with semaphore:
+            # Fetched per resume so long extractions pick up a new token before the old one expires
+            return await load_resume_text(resume, await get_drive_credentials(data), bucket, many=True)
+
+    texts = await asyncio.gather(*(load_one(resume) for resume in resumes), return_exceptions=True)
+
+    failed = []
+    loaded = []
+    for resume, text in zip(resumes, texts):
+        if isinstance(text, Exception):
+            failed.append(resume["id"])
+        else:
+            loaded.append((resume, text, score_cache_key(text)))
+
+    # Resumes seen before are scored straight from the cache
+    scores = await get_cached_scores(supabase, [cache_key for _, _, cache_key in loaded])
+    cached_rows = [
+        {
+            "id": resume["id"],
+            "job_id": resume["job_id"],
+            "google_id": resume["google_id"],
+            "status": "scored",
+            **score_columns(scores[cache_key]),
+            **usage_columns(None),
+        }
+        for resume, _, cache_key in loaded
+        if cache_key in scores
+    ]
+    if cached_rows:
+        await supabase.table("resumes").upsert(cached_rows, on_conflict="id").execute()
+    if failed:
+        await supabase.table("resumes").update({"status": "failed"}).in_("id", failed).execute()
+
+    # Identical texts are requested once, the collector fans each result out to all their resumes
+    requests = defaultdict(list)
+    texts_by_key = {}
+    for resume, text, cache_key in loaded:
+        if cache_key not in scores:
+            requests[cache_key].append(resume["id"])
+            texts_by_key[cache_key] = text
+
+    # The cache key travels in custom_id so results can be cached when the batch is collected
+    batch_lines = [
+        json.dumps({
+            "custom_id": cache_key,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": score_request_body(compact_resume_text(text).text),
+        })
+        for cache_key, text in texts_by_key.items()
+    ]
+    if not batch_lines:
+        return {"batch_id": None, "num_requests": 0, "cached": len(cached_rows), "failed": failed, "requests": {}}
+
+    batch_file = await client.files.create(
+        file=("score_resumes.jsonl", "\n".join(batch_lines).encode("utf-8")),
+        purpose="batch",
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        metadata={"job_id": str(job_id)},
+    )
 
-    arguments = message.function_call.arguments
+    # Returned so the collector can map results to resumes and fail the ones left without a score
+    return {
+        "batch_id": batch.id,
+        "num_requests": len(batch_lines),
+        "cached": len(cached_rows),
+        "failed": failed,
+        "requests": dict(requests),
+    }
 
-    if isinstance(arguments, str):
-        arguments = json.loads(arguments)
-    
-    # Update the resume in the database with the score
-    supabase.table("resumes").update({
-        "gpa": arguments["gpa"],
-        "school_year": arguments["school_year"],
-        "num_internships": arguments["number_of_internships"],
-        "score": arguments["score"],
-        "gpa_contribution": arguments["score_breakdown"]["gpa_contribution"],
-        "experience_contribution": arguments["score_breakdown"]["experience_contribution"],
-        "impact_quality_contribution": arguments["score_breakdown"]["impact_quality_contribution"]
-    }).eq("id", resume_job_id).execute()
 
-    return {"success": True, "message": "Resume scored successfully"}
\ No newline at end of file
+@app.function(image=image, secrets=[gcp_secrets, gcs_secrets], timeout=60 * 30)
+@modal.fastapi_endpoint(
+    method="POST",
+    docs=True
+)
+@traced_endpoint("worker.collect_score_batch")
+async def collect_score_batch(data: dict) -> dict:
+    """
+    Checks an OpenAI batch and, once it has finished, writes its scores back in bulk.
+    With cancel set, a running batch is asked to cancel and is collected by later calls once it is cancelled.
+    With abandon set, the batch is collected as it is, for a cancellation that never completes.
+    Resumes of the batch that end up without a score are marked as failed.
+    """
+    batch_id = data.get("batch_id")
+    if not batch_id:
+        raise HTTPException(status_code=400, detail="Batch ID not found")
+    # Resume ids by the cache key each request was submitted under
+    requests = data.get("requests") or {}
+
+    client = get_batch_openai_client()
+    batch = await client.batches.retrieve(batch_id)
+    if batch.status not in BATCH_TERMINAL_STATUSES and not data.get("abandon"):
+        if data.get("cancel") and batch.status != "cancelling":
+            # Results written while cancelling only show up once the batch is cancelled
+            batch = await client.batches.cancel(batch_id)
+        return {"done": False, "status": batch.status}
+
+    scores = {}
+    usages = {}
+    new_scores = {}
+    failed = []
+    if batch.output_file_id:
+        output = await client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            cache_key = result["custom_id"]
+            resume_job_ids = requests.get(cache_key, [])
+            try:
+                if result.get("error") or result["response"]["status_code"] != 200:
+                    raise ValueError(result.get("error") or result["response"]["status_code"])
+                arguments = parse_score_message(result["response"]["body"]["choices"][0]["message"])
+            except Exception as e:
+                print(f"Failed to score resumes {resume_job_ids}: {e}")
+                failed.extend(resume_job_ids)
+                continue
+            new_scores[cache_key] = arguments
+            for index, resume_job_id in enumerate(resume_job_ids):
+                scores[resume_job_id] = arguments
+                # Tokens are charged to the first resume with this text, duplicates cost none
+                usages[resume_job_id] = usage_columns(result["response"]["body"].get("usage") if index == 0 else None)
+    if batch.error_file_id:
+        errors = await client.files.content(batch.error_file_id)
+        for line in errors.text.splitlines():
+            if line.strip():
+                failed.extend(requests.get(json.loads(line)["custom_id"], []))
+
+    supabase = await get_supabase()
+    await cache_scores(supabase, new_scores)
+
+    if scores:
+        resumes = (await supabase.table("resumes").select("id, job_id, google_id").in_("id", list(scores)).execute()).data
+        await supabase.table("resumes").upsert(
+            [
+                {
+                    "id": resume["id"],
+                    "job_id": resume["job_id"],
+                    "google_id": resume["google_id"],
+                    "status": "scored",
+                    **score_columns(scores[resume["id"]]),
+                    **usages[resume["id"]],
+                }
+                for resume in resumes
+            ],
+            on_conflict="id",
+        ).execute()
+    if failed:
+        await supabase.table("resumes").update({"status": "failed"}).in_("id", failed).execute()
+
+    # A failed batch has no output, an expired or cancelled one only part of it
+    submitted = {resume_job_id for resume_job_ids in requests.values() for resume_job_id in resume_job_ids}
+    unscored = sorted(submitted - set(scores) - set(failed))
+    if unscored:
+        await supabase.table("resumes").update({"status": "failed"}).in_("id", unscored).eq("status", "pending").execute()
+        failed.extend(unscored)
+
+    return {"done": True, "status": batch.status, "scored": len(scores), "failed": failed}
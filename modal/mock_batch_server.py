@@ -0,0 +1,130 @@
+"""
+Minimal stand-in for the OpenAI Files and Batches API used by the bulk scoring mode.
+
+Batches complete as soon as they are created and every request is answered with a
+deterministic score_resume function call. Point the workers at it with
+OPENAI_BATCH_BASE_URL=http://localhost:8001/v1 and run:
+
+    uvicorn mock_batch_server:app --port 8001
+"""
+
+import json
+import time
+import uuid
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse
+
+app = FastAPI(title="Mock OpenAI Batch API")
+
+files: dict[str, bytes] = {}
+batches: dict[str, dict] = {}
+
+
+def mock_score(custom_id: str) -> dict:
+    """Deterministic score_resume arguments derived from the request id."""
+    score = sum(custom_id.encode("utf-8")) % 101
+    return {
+        "gpa": 3.5,
+        "school_year": "Junior",
+        "number_of_internships": 1,
+        "score": score,
+        "score_breakdown": {
+            "gpa_contribution": 25,
+            "experience_contribution": 30,
+            "impact_quality_contribution": 10,
+        },
+    }
+
+
+@app.post("/v1/files")
+async def create_file(file: UploadFile = File(...), purpose: str = Form(...)):
+    file_id = f"file-{uuid.uuid4().hex}"
+    files[file_id] = await file.read()
+    return {"id": file_id, "object": "file", "bytes": len(files[file_id]), "created_at": int(time.time()), "filename": file.filename, "purpose": purpose, "status": "processed"}
+
+
+@app.get("/v1/files/{file_id}/content", response_class=PlainTextResponse)
+async def get_file_content(file_id: str):
+    if file_id not in files:
+        raise HTTPException(status_code=404, detail="File not found")
+    return files[file_id].decode("utf-8")
+
+
+@app.post("/v1/batches")
+async def create_batch(body: dict):
+    if body["input_file_id"] not in files:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    output_lines = []
+    for line in files[body["input_file_id"]].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        output_lines.append(json.dumps({
+            "id": f"batch_req_{uuid.uuid4().hex}",
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "request_id": uuid.uuid4().hex,
+                "body": {
+                    "object": "chat.completion",
+                    "model": request["body"]["model"],
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {
+                            "role": "assistant",
+                            "content": None,
+                            "tool_calls": [{
+                                "id": f"call_{uuid.uuid4().hex}",
+                                "type": "function",
+                                "function": {"name": "score_resume", "arguments": json.dumps(mock_score(request["custom_id"]))},
+                            }],
+                        },
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "prompt_tokens_details": {"cached_tokens": 0}},
+                },
+            },
+            "error": None,
+        }))
+
+    output_file_id = f"file-{uuid.uuid4().hex}"
+    files[output_file_id] = "\n".join(output_lines).encode("utf-8")
+
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    now = int(time.time())
+    batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": body["endpoint"],
+        "input_file_id": body["input_file_id"],
+        "completion_window": body["completion_window"],
+        "status": "completed",
+        "output_file_id": output_file_id,
+        "error_file_id": None,
+        "created_at": now,
+        "completed_at": now,
+        "request_counts": {"total": len(output_lines), "completed": len(output_lines), "failed": 0},
+        "metadata": body.get("metadata"),
+    }
+    return batches[batch_id]
+
+
+@app.get("/v1/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    if batch_id not in batches:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    # Like the real API, a cancellation is only finished on a later check
+    if batches[batch_id]["status"] == "cancelling":
+        batches[batch_id]["status"] = "cancelled"
+    return batches[batch_id]
+
+
+@app.post("/v1/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
+    if batch_id not in batches:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batches[batch_id]["status"] not in ("completed", "failed", "expired", "cancelled"):
+        batches[batch_id]["status"] = "cancelling"
+    return batches[batch_id]
@@ -1,3 +1,6 @@
+import hashlib
+import json
+
 # Function schema   
 score_resume_function_schema = {
     "name": "score_resume",
@@ -173,4 +176,11 @@ FINAL RULES
 - Return results ONLY via the score_resume function
 - Do NOT include freeform explanations or reasoning
 
-"""
\ No newline at end of file
+"""
+
+
+# Version of the scoring prompt and schema. Changes whenever either of them changes,
+# which invalidates every cached score computed with the previous version.
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + json.dumps(score_resume_function_schema, sort_keys=True)).encode("utf-8")
+).hexdigest()[:16]
@@ -0,0 +1,170 @@
+"""
+Token-bucket rate limiting and adaptive concurrency for OpenAI calls.
+
+The bucket state lives in a store shared by every container (a modal.Dict in production,
+LocalLimiterStore in tests and local runs). Updates are read-modify-write without a
+cross-container lock, so the limits are approximate and sized slightly below the account's.
+
+The concurrency limit is shared as well: every container publishes its number of requests in
+flight, and a request only starts while the total across containers is below the limit.
+"""
+
+import asyncio
+import math
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+# Rough number of characters per token for English text
+CHARS_PER_TOKEN = 4
+# In-flight counts older than this are ignored, so a container that died does not hold slots forever
+IN_FLIGHT_TTL = 120
+# How often a request waiting on other containers' slots checks again
+SLOT_POLL_SECONDS = 0.25
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap estimate of the number of tokens in a text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class LocalLimiterStore:
+    """In-process stand-in for the shared limiter store."""
+
+    def __init__(self):
+        self._data = {}
+
+    async def get(self, key: str, default=None):
+        return self._data.get(key, default)
+
+    async def put(self, key: str, value) -> None:
+        self._data[key] = value
+
+
+class ModalDictStore:
+    """Limiter store backed by a modal.Dict shared across containers."""
+
+    def __init__(self, modal_dict):
+        self._dict = modal_dict
+
+    async def get(self, key: str, default=None):
+        return await self._dict.get.aio(key, default)
+
+    async def put(self, key: str, value) -> None:
+        await self._dict.put.aio(key, value)
+
+
+class RateLimiter:
+    """Shared request and token budget with AIMD concurrency control."""
+
+    def __init__(self, store, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int, min_concurrency: int = 1):
+        self.store = store
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self._lock = asyncio.Lock()
+        self._in_flight = 0
+        self._slot_freed = asyncio.Condition()
+        self._container_id = uuid.uuid4().hex
+
+    async def _concurrency(self) -> int:
+        return await self.store.get("concurrency", self.max_concurrency)
+
+    async def _others_in_flight(self) -> dict:
+        """Fresh in-flight counts of the other containers, as (count, updated) by container id."""
+        now = time.time()
+        in_flight = await self.store.get("in_flight") or {}
+        return {
+            container_id: (count, updated)
+            for container_id, (count, updated) in in_flight.items()
+            if container_id != self._container_id and updated > now - IN_FLIGHT_TTL
+        }
+
+    async def _publish_in_flight(self) -> None:
+        """Writes this container's in-flight count, a lost update is corrected by the next one."""
+        in_flight = await self._others_in_flight()
+        if self._in_flight:
+            in_flight[self._container_id] = (self._in_flight, time.time())
+        await self.store.put("in_flight", in_flight)
+
+    async def _total_in_flight(self) -> int:
+        others = await self._others_in_flight()
+        return self._in_flight + sum(count for count, _ in others.values())
+
+    async def _take_budget(self, tokens: int) -> float:
+        """Takes one request and the tokens from the bucket, or returns how long to wait."""
+        async with self._lock:
+            now = time.time()
+            blocked_until = await self.store.get("blocked_until", 0)
+            if blocked_until > now:
+                return blocked_until - now
+
+            bucket = await self.store.get("bucket") or {
+                "requests": self.requests_per_minute,
+                "tokens": self.tokens_per_minute,
+                "updated": now,
+            }
+            elapsed = max(now - bucket["updated"], 0)
+            requests = min(self.requests_per_minute, bucket["requests"] + elapsed * self.requests_per_minute / 60)
+            available = min(self.tokens_per_minute, bucket["tokens"] + elapsed * self.tokens_per_minute / 60)
+            # A single request larger than the whole budget is let through once the bucket is full
+            tokens = min(tokens, self.tokens_per_minute)
+
+            if requests >= 1 and available >= tokens:
+                await self.store.put("bucket", {"requests": requests - 1, "tokens": available - tokens, "updated": now})
+                return 0
+
+            wait_for_requests = (1 - requests) * 60 / self.requests_per_minute if requests < 1 else 0
+            wait_for_tokens = (tokens - available) * 60 / self.tokens_per_minute if available < tokens else 0
+            return max(wait_for_requests, wait_for_tokens)
+
+    @asynccontextmanager
+    async def limit(self, tokens: int):
+        """Waits for a concurrency slot shared by every container and enough budget for a request of the given size."""
+        async with self._slot_freed:
+            while await self._total_in_flight() >= await self._concurrency():
+                # Slots freed by other containers are not signalled, so check again periodically
+                try:
+                    await asyncio.wait_for(self._slot_freed.wait(), SLOT_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            self._in_flight += 1
+            await self._publish_in_flight()
+        try:
+            while (wait := await self._take_budget(tokens)) > 0:
+                await asyncio.sleep(wait)
+            yield
+        finally:
+            async with self._slot_freed:
+                self._in_flight -= 1
+                await self._publish_in_flight()
+                self._slot_freed.notify_all()
+
+    async def record_success(self) -> None:
+        """Additive increase of the shared concurrency limit."""
+        concurrency = await self._concurrency()
+        if concurrency < self.max_concurrency:
+            await self.store.put("concurrency", concurrency + 1)
+
+    async def record_rate_limited(self, retry_after: float) -> None:
+        """Multiplicative decrease of the shared concurrency limit and a pause for every container."""
+        concurrency = await self._concurrency()
+        await self.store.put("concurrency", max(self.min_concurrency, concurrency // 2))
+        blocked_until = time.time() + retry_after
+        if blocked_until > await self.store.get("blocked_until", 0):
+            await self.store.put("blocked_until", blocked_until)
+
+
+def retry_after_seconds(headers, default: float = 1.0) -> float:
+    """Reads the server requested back-off from rate limit response headers."""
+    if headers is None:
+        return default
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            return default
+    return default
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Worker modules import each other flat from the modal directory, as they do in the image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,52 @@
+from compaction import CHARS_PER_TOKEN, compact_resume_text
+
+
+def test_page_numbers_are_dropped_only_at_page_edges():
+    text = "Jane Doe\nEducation\nState University\n2025\nGPA 3.8\n1\f" "Experience\nAcme Intern\n2"
+    lines = compact_resume_text(text).text.splitlines()
+    assert "2025" in lines
+    assert "1" not in lines
+    assert "2" not in lines
+
+
+def test_page_x_of_y_footers_are_dropped():
+    text = "Jane Doe\nSkills\nPython\nPage 1 of 2\fProjects\nCompiler\nPage 2 of 2"
+    assert "Page" not in compact_resume_text(text).text
+
+
+def test_running_headers_are_kept_once():
+    header = "Jane Doe | jane@example.com"
+    text = f"{header}\nEducation\nState University\f{header}\nExperience\nAcme Intern"
+    compacted = compact_resume_text(text).text
+    assert compacted.count(header) == 1
+    assert "State University" in compacted
+    assert "Acme Intern" in compacted
+
+
+def test_boilerplate_and_blank_runs_are_dropped():
+    text = "Resume\nJane Doe\n\n\n\nEducation\nState University\nReferences available upon request"
+    assert compact_resume_text(text).text == "Jane Doe\n\nEducation\nState University"
+
+
+def test_text_within_budget_is_not_truncated():
+    result = compact_resume_text("Jane Doe\nEducation\nState University", max_tokens=100)
+    assert not result.truncated
+    assert result.compacted_tokens <= 100
+
+
+def test_truncation_drops_lowest_priority_sections_first():
+    text = "\n".join(
+        ["Jane Doe", "Experience"]
+        + [f"Intern at company {i}" for i in range(10)]
+        + ["Interests"]
+        + [f"Hobby number {i} with some words" for i in range(20)]
+        + ["Awards", "Dean's list"]
+    )
+    result = compact_resume_text(text, max_tokens=80)
+    lines = result.text.splitlines()
+    assert result.truncated
+    assert len(result.text) <= 80 * CHARS_PER_TOKEN
+    assert all(f"Intern at company {i}" in lines for i in range(10))
+    assert "Dean's list" in lines
+    assert "Hobby number 19 with some words" not in lines
+    assert result.tokens_saved > 0
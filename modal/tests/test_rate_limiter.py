@@ -0,0 +1,104 @@
+import asyncio
+
+import rate_limiter
+from rate_limiter import LocalLimiterStore, RateLimiter, estimate_tokens, retry_after_seconds
+
+
+def make_limiter(store=None, **kwargs):
+    options = {"requests_per_minute": 600, "tokens_per_minute": 60_000, "max_concurrency": 8}
+    options.update(kwargs)
+    return RateLimiter(store or LocalLimiterStore(), **options)
+
+
+def test_success_increases_concurrency_up_to_the_maximum():
+    async def run():
+        limiter = make_limiter(max_concurrency=3)
+        await limiter.store.put("concurrency", 1)
+        for _ in range(5):
+            await limiter.record_success()
+        return await limiter.store.get("concurrency")
+
+    assert asyncio.run(run()) == 3
+
+
+def test_rate_limit_halves_concurrency_down_to_the_minimum():
+    async def run():
+        limiter = make_limiter(max_concurrency=8, min_concurrency=2)
+        seen = []
+        for _ in range(3):
+            await limiter.record_rate_limited(0)
+            seen.append(await limiter.store.get("concurrency"))
+        return seen
+
+    assert asyncio.run(run()) == [4, 2, 2]
+
+
+def test_rate_limit_blocks_every_limiter_until_retry_after():
+    async def run():
+        store = LocalLimiterStore()
+        first, second = make_limiter(store), make_limiter(store)
+        await first.record_rate_limited(30)
+        # A shorter retry-after never shortens the pause
+        await first.record_rate_limited(1)
+        return await second._take_budget(10)
+
+    wait = asyncio.run(run())
+    assert 29 < wait <= 30
+
+
+def test_budget_waits_once_requests_are_used_up():
+    async def run():
+        limiter = make_limiter(requests_per_minute=2)
+        return [await limiter._take_budget(1) for _ in range(3)]
+
+    first, second, third = asyncio.run(run())
+    assert first == 0 and second == 0
+    assert 0 < third <= 30
+
+
+def test_budget_waits_for_tokens():
+    async def run():
+        limiter = make_limiter(tokens_per_minute=600)
+        return await limiter._take_budget(500), await limiter._take_budget(500)
+
+    first, second = asyncio.run(run())
+    assert first == 0
+    # 400 tokens short at 10 tokens per second
+    assert 39 < second <= 40
+
+
+def test_concurrency_is_shared_across_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "SLOT_POLL_SECONDS", 0.01)
+    running = 0
+    peak = 0
+
+    async def call(limiter):
+        nonlocal running, peak
+        async with limiter.limit(1):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+    async def run():
+        store = LocalLimiterStore()
+        limiters = [make_limiter(store, max_concurrency=2) for _ in range(3)]
+        await asyncio.gather(*(call(limiter) for limiter in limiters for _ in range(3)))
+        return await store.get("in_flight")
+
+    in_flight = asyncio.run(run())
+    assert peak == 2
+    assert in_flight == {}
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds({"retry-after-ms": "1500"}) == 1.5
+    assert retry_after_seconds({"retry-after": "3"}) == 3.0
+    assert retry_after_seconds({"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"}, default=2.0) == 2.0
+    assert retry_after_seconds({}, default=2.0) == 2.0
+    assert retry_after_seconds(None) == 1.0
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcde") == 2
@@ -0,0 +1,79 @@
+"""
+Bounded least recently used cache of extracted resume texts on the container's local disk.
+
+Only content-addressed texts are cached, their blob never changes once written, so a warm
+container can serve them without asking GCS whether they still exist.
+"""
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "prorank-text-cache"))
+TEXT_CACHE_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class TextCache:
+    """Disk-backed LRU of texts keyed by blob name, safe to use from worker threads."""
+
+    def __init__(self, directory: str = TEXT_CACHE_DIR, max_bytes: int = TEXT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+
+        # Pick up what an earlier process in this container left behind, oldest first
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if not name.endswith(".tmp")]
+        for path in sorted(paths, key=os.path.getmtime):
+            size = os.path.getsize(path)
+            self._sizes[os.path.basename(path)] = size
+            self._total += size
+        self._evict()
+
+    def _path(self, key: str) -> tuple[str, str]:
+        name = sha256(key.encode("utf-8")).hexdigest()
+        return name, os.path.join(self.directory, name)
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and self._sizes:
+            name, size = self._sizes.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> str | None:
+        name, path = self._path(key)
+        with self._lock:
+            if name not in self._sizes:
+                return None
+            self._sizes.move_to_end(name)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._sizes.pop(name, 0)
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        name, path = self._path(key)
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+
+        # Written under a temporary name so readers never see a partial file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total += len(data) - self._sizes.pop(name, 0)
+            self._sizes[name] = len(data)
+            self._evict()
@@ -0,0 +1 @@
+../backend/services/tracing_service.py
\ No newline at end of file